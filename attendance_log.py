@@ -0,0 +1,267 @@
+import json
+import os
+import threading
+from datetime import date, datetime, timedelta
+
+# Load configuration from config_template.py
+try:
+    from config_template import (
+        ATTENDANCE_LOG_DIR,
+        ATTENDANCE_LOG_FLUSH_EVERY,
+        ATTENDANCE_LOG_FLUSH_SEC
+    )
+except ImportError as e:
+    print(f"[ERROR] Failed to import configuration in attendance_log.py: {e}")
+    print("Please ensure config_template.py exists and .env is configured properly.")
+    raise
+
+TS_FORMAT = "%Y-%m-%d %H:%M:%S"
+INDEX_FILE = "index.json"
+INDEX_VERSION = 2
+
+# ==========================
+# Layout
+# ==========================
+# ATTENDANCE_LOG_DIR/
+#   2025-10-19.jsonl   one JSON record per line, one file (segment) per day
+#   index.json         {"version": 2, "students": {name: [day, ...]}, "guardians": {"student/guardian": [day, ...]}}
+#
+# A record looks like:
+#   {"ts": "2025-10-19 08:01:02", "event": "checkin", "student": "Asha", "guardian": null}
+# Day segments make date-range queries read only the days asked for; the index lets
+# per-student / per-guardian queries skip days on which that person never appears.
+# Guardian names come from guardian/<name>.jpg and are only unique per student, so the
+# guardian index is keyed by guardian_key(student, guardian).
+
+def segment_path(log_dir: str, day) -> str:
+    return os.path.join(log_dir, f"{day}.jsonl")
+
+def guardian_key(student: str, guardian: str) -> str:
+    """Index key for one student's guardian ('/' cannot occur in a student folder name)."""
+    return f"{student}/{guardian}"
+
+
+class AttendanceLog:
+    """Append-only, day-segmented attendance log with buffered writes."""
+
+    def __init__(self, log_dir: str = ATTENDANCE_LOG_DIR, flush_every: int = ATTENDANCE_LOG_FLUSH_EVERY,
+                 flush_interval: float = ATTENDANCE_LOG_FLUSH_SEC):
+        self.log_dir = log_dir
+        self.flush_every = max(1, flush_every)
+        self.flush_interval = flush_interval
+        os.makedirs(log_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._buffer = []
+        self._index = load_index(log_dir)
+        self._closed = threading.Event()
+        self._flusher = threading.Thread(target=self._flush_periodically, name="attendance-log-flush", daemon=True)
+        self._flusher.start()
+
+    def append(self, event: str, student: str, guardian: str = None, ts: str = None):
+        """Buffers one record; `ts` defaults to now in the usual 'YYYY-mm-dd HH:MM:SS' format."""
+        record = {
+            "ts": ts or datetime.now().strftime(TS_FORMAT),
+            "event": event,
+            "student": student,
+            "guardian": guardian,
+        }
+        with self._lock:
+            self._buffer.append(record)
+            should_flush = len(self._buffer) >= self.flush_every
+        if should_flush:
+            self.flush()
+        return record
+
+    def flush(self):
+        """Writes buffered records to their day segments and updates the index."""
+        with self._lock:
+            records, self._buffer = self._buffer, []
+            if not records:
+                return
+            by_day = {}
+            for record in records:
+                by_day.setdefault(record["ts"][:10], []).append(record)
+
+            index_changed = False
+            try:
+                for day, day_records in by_day.items():
+                    with open(segment_path(self.log_dir, day), "a", encoding="utf-8") as f:
+                        f.writelines(json.dumps(r, ensure_ascii=False) + "\n" for r in day_records)
+                    for r in day_records:
+                        index_changed |= self._index_add("students", r["student"], day)
+                        if r.get("guardian"):
+                            index_changed |= self._index_add("guardians", guardian_key(r["student"], r["guardian"]), day)
+                if index_changed:
+                    save_index(self.log_dir, self._index)
+                print(f"[LOG] Wrote {len(records)} attendance record(s) to {self.log_dir}")
+            except Exception as e:
+                # Keep the records so the next flush retries them.
+                self._buffer = records + self._buffer
+                print(f"[WARN] Failed to write attendance log ({e})")
+
+    def _index_add(self, kind: str, name: str, day: str) -> bool:
+        if not name:
+            return False
+        days = self._index[kind].setdefault(name, [])
+        if day in days:
+            return False
+        days.append(day)
+        days.sort()
+        return True
+
+    def _flush_periodically(self):
+        while not self._closed.wait(self.flush_interval):
+            self.flush()
+
+    def close(self):
+        self._closed.set()
+        self.flush()
+
+
+# ==========================
+# Index
+# ==========================
+def load_index(log_dir: str) -> dict:
+    path = os.path.join(log_dir, INDEX_FILE)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            index = json.load(f)
+    except FileNotFoundError:
+        index = {"version": INDEX_VERSION}
+    except Exception as e:
+        print(f"[WARN] Attendance index unreadable ({e}); it will be rebuilt as records are written. "
+              f"Run 'python attendance_report.py reindex' to rebuild it now.")
+        index = {"version": INDEX_VERSION}
+    if index.get("version") != INDEX_VERSION:
+        # Older indexes keyed guardians by bare name, which mixes up same-named guardians of different students.
+        print("[LOG] Attendance index is from an older version; rebuilding it.")
+        return rebuild_index(log_dir)
+    index.setdefault("students", {})
+    index.setdefault("guardians", {})
+    return index
+
+def save_index(log_dir: str, index: dict):
+    path = os.path.join(log_dir, INDEX_FILE)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(index, f, ensure_ascii=False, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+
+def rebuild_index(log_dir: str) -> dict:
+    """Re-creates index.json by scanning every day segment."""
+    index = {"version": INDEX_VERSION, "students": {}, "guardians": {}}
+    for day in list_days(log_dir):
+        for record in read_day(log_dir, day):
+            student = record.get("student")
+            keys = [("students", student)]
+            if record.get("guardian"):
+                keys.append(("guardians", guardian_key(student, record["guardian"])))
+            for kind, key in keys:
+                if key and day not in index[kind].setdefault(key, []):
+                    index[kind][key].append(day)
+    save_index(log_dir, index)
+    return index
+
+
+# ==========================
+# Reading
+# ==========================
+def list_days(log_dir: str):
+    """All days that have a segment file, sorted."""
+    if not os.path.isdir(log_dir):
+        return []
+    return sorted(name[:-len(".jsonl")] for name in os.listdir(log_dir) if name.endswith(".jsonl"))
+
+def read_day(log_dir: str, day):
+    path = segment_path(log_dir, day)
+    if not os.path.exists(path):
+        return
+    with open(path, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                print(f"[WARN] Skipping malformed record {path}:{line_no}")
+
+def days_in_range(start: date, end: date):
+    day = start
+    while day <= end:
+        yield day.isoformat()
+        day += timedelta(days=1)
+
+def query(log_dir: str = ATTENDANCE_LOG_DIR, start: date = None, end: date = None,
+          student: str = None, guardian: str = None, event: str = None):
+    """
+    Yields records in [start, end] (inclusive dates), optionally filtered by student, guardian and event.
+    Only the segments for the requested days are opened; with a student or guardian filter,
+    only the days listed for that name in the index. A guardian filter without a student matches
+    that guardian name for every student (see guardian_students()).
+    """
+    if student or guardian:
+        index = load_index(log_dir)
+        if guardian and student:
+            candidates = set(index["guardians"].get(guardian_key(student, guardian), []))
+        elif guardian:
+            candidates = set()
+            for s in guardian_students(log_dir, guardian, index):
+                candidates.update(index["guardians"][guardian_key(s, guardian)])
+        else:
+            candidates = set(index["students"].get(student, []))
+        days = sorted(candidates)
+        if start:
+            days = [d for d in days if d >= start.isoformat()]
+        if end:
+            days = [d for d in days if d <= end.isoformat()]
+    elif start or end:
+        all_days = list_days(log_dir) if not (start and end) else None
+        first = start or (date.fromisoformat(all_days[0]) if all_days else None)
+        last = end or (date.fromisoformat(all_days[-1]) if all_days else None)
+        days = list(days_in_range(first, last)) if first and last else []
+    else:
+        days = list_days(log_dir)
+
+    for day in days:
+        for record in read_day(log_dir, day):
+            if student and record.get("student") != student:
+                continue
+            if guardian and record.get("guardian") != guardian:
+                continue
+            if event and record.get("event") != event:
+                continue
+            yield record
+
+
+def guardian_students(log_dir: str, guardian: str, index: dict = None):
+    """Students who have a guardian called `guardian` in the log, sorted."""
+    index = index or load_index(log_dir)
+    return sorted(key.rsplit("/", 1)[0] for key in index["guardians"] if key.rsplit("/", 1)[1] == guardian)
+
+
+_attendance_log = None
+_attendance_log_lock = threading.Lock()
+
+def get_attendance_log() -> AttendanceLog:
+    """Returns the process-wide attendance log shared by check-in and checkout."""
+    global _attendance_log
+    with _attendance_log_lock:
+        if _attendance_log is None:
+            _attendance_log = AttendanceLog()
+        return _attendance_log
+
+def flush_attendance_log():
+    """Writes out buffered records of the shared log, if one was opened."""
+    log = _attendance_log
+    if log is not None:
+        log.flush()
+
+def close_attendance_log():
+    """Flushes and closes the shared attendance log, if one was opened."""
+    global _attendance_log
+    with _attendance_log_lock:
+        log, _attendance_log = _attendance_log, None
+    if log is not None:
+        log.close()
@@ -0,0 +1,140 @@
+"""
+Query the structured attendance log.
+
+    python attendance_report.py day 2025-10-19                 # who was at school, with check-in/out times
+    python attendance_report.py student Asha --from 2025-10-01 --to 2025-10-31
+    python attendance_report.py guardian Mom --student Asha    # --student is needed if several students have a "Mom"
+    python attendance_report.py export --from 2025-10-01 --to 2025-10-31 --csv october.csv
+    python attendance_report.py reindex                        # rebuild index.json from the day files
+
+Any query accepts --csv PATH to write the matching records instead of printing them.
+Work is proportional to the days queried, not to the size of the whole log.
+"""
+import argparse
+import csv
+import sys
+from datetime import date
+
+from attendance_log import ATTENDANCE_LOG_DIR, guardian_students, query, rebuild_index
+
+CSV_FIELDS = ("ts", "event", "student", "guardian")
+
+
+def parse_day(value: str) -> date:
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected a date like 2025-10-19, got '{value}'")
+
+
+def write_csv(records, path: str) -> int:
+    count = 0
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=CSV_FIELDS, extrasaction="ignore")
+        writer.writeheader()
+        for record in records:
+            writer.writerow(record)
+            count += 1
+    print(f"[REPORT] Wrote {count} record(s) to {path}")
+    return count
+
+
+def print_records(records) -> int:
+    count = 0
+    for r in records:
+        guardian = f" (Guardian: {r['guardian']})" if r.get("guardian") else ""
+        print(f"{r['ts']}  {r['event']:<8}  {r['student']}{guardian}")
+        count += 1
+    if not count:
+        print("[REPORT] No matching records.")
+    return count
+
+
+def day_summary(log_dir: str, day: date):
+    """One row per student seen on `day`: first check-in, last checkout and who collected them."""
+    summary = {}
+    for r in query(log_dir, start=day, end=day):
+        row = summary.setdefault(r["student"], {"checkin": None, "checkout": None, "guardian": None})
+        time_only = r["ts"][11:]
+        if r["event"] == "checkin" and (row["checkin"] is None or time_only < row["checkin"]):
+            row["checkin"] = time_only
+        elif r["event"] == "checkout" and (row["checkout"] is None or time_only > row["checkout"]):
+            row["checkout"] = time_only
+            row["guardian"] = r.get("guardian")
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Query the attendance log.")
+    parser.add_argument("--log-dir", default=ATTENDANCE_LOG_DIR, help="Attendance log directory (default: ATTENDANCE_LOG_DIR).")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    def add_range(p):
+        p.add_argument("--from", dest="start", type=parse_day, default=None, help="First day (inclusive).")
+        p.add_argument("--to", dest="end", type=parse_day, default=None, help="Last day (inclusive).")
+        p.add_argument("--csv", default=None, help="Write matching records to this CSV file.")
+
+    p_day = sub.add_parser("day", help="Who was at school on a day.")
+    p_day.add_argument("day", type=parse_day)
+    p_day.add_argument("--csv", default=None, help="Write the day's records to this CSV file.")
+
+    p_student = sub.add_parser("student", help="Records for one student.")
+    p_student.add_argument("name")
+    add_range(p_student)
+
+    p_guardian = sub.add_parser("guardian", help="Checkouts handled by one guardian.")
+    p_guardian.add_argument("name")
+    p_guardian.add_argument("--student", default=None, help="Whose guardian (names are only unique per student).")
+    add_range(p_guardian)
+
+    p_export = sub.add_parser("export", help="All records in a date range.")
+    add_range(p_export)
+
+    sub.add_parser("reindex", help="Rebuild index.json from the day files.")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "reindex":
+        index = rebuild_index(args.log_dir)
+        print(f"[REPORT] Index rebuilt: {len(index['students'])} students, {len(index['guardians'])} guardians.")
+        return 0
+
+    if args.command == "day":
+        if args.csv:
+            write_csv(query(args.log_dir, start=args.day, end=args.day), args.csv)
+            return 0
+        summary = day_summary(args.log_dir, args.day)
+        if not summary:
+            print(f"[REPORT] No attendance recorded on {args.day}.")
+            return 0
+        print(f"Attendance on {args.day}: {len(summary)} student(s)\n")
+        print(f"{'Student':<24} {'Check-in':<10} {'Check-out':<10} Guardian")
+        for name in sorted(summary):
+            row = summary[name]
+            print(f"{name:<24} {row['checkin'] or '-':<10} {row['checkout'] or '-':<10} {row['guardian'] or '-'}")
+        return 0
+
+    filters = {}
+    if args.command == "student":
+        filters["student"] = args.name
+    elif args.command == "guardian":
+        filters["guardian"] = args.name
+        if args.student:
+            filters["student"] = args.student
+        else:
+            students = guardian_students(args.log_dir, args.name)
+            if len(students) > 1:
+                print(f"[REPORT] Several students have a guardian called '{args.name}': {', '.join(students)}. "
+                      f"Pick one with --student.")
+                return 1
+            filters["student"] = students[0] if students else None
+    records = query(args.log_dir, start=args.start, end=args.end, **filters)
+    if args.csv:
+        write_csv(records, args.csv)
+    else:
+        print_records(records)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,116 @@
+"""
+Compare face-detector backends on the same set of frames.
+
+    python bench_detectors.py --frames D:/gate_frames --backends hog,yunet
+    python bench_detectors.py --frames D:/gate_frames --labels D:/gate_frames/labels.json
+
+Frames are downscaled by FRAME_SCALE exactly like the live check-in path.
+Recall is measured against --labels, a JSON file mapping image file name to a list of
+full-resolution boxes [top, right, bottom, left]. Without labels every frame is assumed
+to show one face, and recall is the fraction of frames where at least one face was found.
+"""
+import argparse
+import glob
+import json
+import os
+import time
+
+import cv2
+
+from config_template import FRAME_SCALE
+from face_detectors import DETECTORS, get_face_detector
+from face_pipeline import box_iou
+
+IMAGE_EXTS = ("*.jpg", "*.jpeg", "*.png", "*.bmp", "*.webp")
+
+
+def load_frames(frames_dir, scale):
+    frames = []
+    for ext in IMAGE_EXTS:
+        for path in sorted(glob.glob(os.path.join(frames_dir, ext))):
+            bgr = cv2.imread(path)
+            if bgr is None:
+                print(f"[WARN] Could not read {path}, skipped.")
+                continue
+            small = cv2.resize(bgr, (0, 0), fx=scale, fy=scale)
+            frames.append((os.path.basename(path), cv2.cvtColor(small, cv2.COLOR_BGR2RGB)))
+    return frames
+
+
+def count_hits(boxes, truth, scale, iou_threshold):
+    """Number of ground-truth boxes matched by a detection (greedy, one detection per truth box)."""
+    remaining = list(boxes)
+    hits = 0
+    for t in truth:
+        t = tuple(int(round(v * scale)) for v in t)
+        best = max(remaining, key=lambda b: box_iou(b, t), default=None)
+        if best is not None and box_iou(best, t) >= iou_threshold:
+            remaining.remove(best)
+            hits += 1
+    return hits
+
+
+def bench_backend(name, frames, labels, scale, repeat, iou_threshold):
+    detector = get_face_detector(name)
+    detector.detect(frames[0][1])  # warm-up, excluded from timing
+
+    elapsed = 0.0
+    detections = 0
+    hits = 0
+    expected = 0
+    for _ in range(repeat):
+        for fname, rgb in frames:
+            start = time.perf_counter()
+            boxes = detector.detect(rgb)
+            elapsed += time.perf_counter() - start
+            detections += len(boxes)
+            if labels is not None:
+                truth = labels.get(fname, [])
+                expected += len(truth)
+                hits += count_hits(boxes, truth, scale, iou_threshold)
+            else:
+                expected += 1
+                hits += 1 if boxes else 0
+
+    runs = len(frames) * repeat
+    return {
+        "backend": name,
+        "ms_per_frame": 1000.0 * elapsed / runs,
+        "fps": runs / elapsed if elapsed > 0 else float("inf"),
+        "faces_per_frame": detections / runs,
+        "recall": hits / expected if expected else float("nan"),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark face-detector backends (throughput and recall).")
+    parser.add_argument("--frames", required=True, help="Directory of gate frames (images).")
+    parser.add_argument("--labels", default=None, help="Optional JSON file: {file name: [[top, right, bottom, left], ...]}.")
+    parser.add_argument("--backends", default=",".join(DETECTORS), help="Comma-separated backends to compare.")
+    parser.add_argument("--scale", type=float, default=FRAME_SCALE, help="Downscale factor applied before detection.")
+    parser.add_argument("--repeat", type=int, default=3, help="Passes over the frame set per backend.")
+    parser.add_argument("--iou", type=float, default=0.5, help="IoU needed for a detection to count as a hit.")
+    args = parser.parse_args()
+
+    frames = load_frames(args.frames, args.scale)
+    if not frames:
+        print(f"[ERR] No images found in {args.frames}")
+        return
+    labels = None
+    if args.labels:
+        with open(args.labels, "r", encoding="utf-8") as f:
+            labels = json.load(f)
+
+    print(f"[BENCH] {len(frames)} frames at scale {args.scale}, {args.repeat} pass(es) per backend\n")
+    print(f"{'backend':<8} {'ms/frame':>9} {'fps':>7} {'faces/frame':>12} {'recall':>7}")
+    for name in [b.strip() for b in args.backends.split(",") if b.strip()]:
+        try:
+            r = bench_backend(name, frames, labels, args.scale, args.repeat, args.iou)
+        except Exception as e:
+            print(f"{name:<8} skipped: {e}")
+            continue
+        print(f"{r['backend']:<8} {r['ms_per_frame']:>9.1f} {r['fps']:>7.1f} {r['faces_per_frame']:>12.2f} {r['recall']:>7.2%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Micro-benchmark of recognition_engine in isolation (no camera, LCD, Sheets or notifications).
+
+    python bench_engine.py                                   # matching only, synthetic gallery
+    python bench_engine.py --gallery 2000 --faces 1,4,16
+    python bench_engine.py --frames D:/gate_frames           # full engine on real frames, per-stage timings
+
+Matching compares the previous per-face path (face_recognition.face_distance + argmin for every
+face) with Gallery.match(), which matches all faces of a batch with one matrix product, on a
+random gallery of --gallery encodings. Results are checked to agree before timings are printed.
+
+With --frames, every image in the folder is run through RecognitionEngine.recognize() against the
+enrolled --students gallery in batches of --batch frames; a stage hook collects per-stage time.
+"""
+import argparse
+import glob
+import os
+import time
+
+import cv2
+import face_recognition
+import numpy as np
+
+from config_template import STUDENTS_DIR
+from recognition_engine import Gallery, RecognitionEngine, load_gallery
+
+IMAGE_EXTS = ("*.jpg", "*.jpeg", "*.png", "*.bmp", "*.webp")
+
+
+def parse_ints(value):
+    return [int(v) for v in value.split(",") if v.strip()]
+
+
+def per_face_match(known_encodings, known_names, encodings, tolerance):
+    """The matching loop the modes used before the engine."""
+    results = []
+    for enc in encodings:
+        distances = face_recognition.face_distance(known_encodings, enc)
+        best_idx = int(np.argmin(distances))
+        best_dist = float(distances[best_idx])
+        results.append((known_names[best_idx] if best_dist <= tolerance else None, best_dist))
+    return results
+
+
+def bench_matching(args):
+    rng = np.random.default_rng(0)
+    # Real encodings are roughly unit-length 128-d vectors; scale random ones to match.
+    known = rng.normal(size=(args.gallery, 128)) / np.sqrt(128)
+    names = [f"Student_{i // 3:04d}" for i in range(args.gallery)]
+    gallery = Gallery(known, names)
+    known_list = list(known)
+
+    print(f"[BENCH] Matching against {args.gallery} enrolled encodings ({args.repeat} repeats)\n")
+    print(f"{'faces':>6} {'per-face ms':>12} {'batched ms':>11} {'speed-up':>9}")
+    for faces in args.faces:
+        queries = known[rng.integers(0, args.gallery, size=faces)] + rng.normal(scale=0.02, size=(faces, 128))
+
+        old = per_face_match(known_list, names, queries, 0.6)
+        new = gallery.match(queries, 0.6)
+        assert [n for n, _ in old] == [n for n, _ in new], "batched matching disagrees with face_distance"
+        assert np.allclose([d for _, d in old], [d for _, d in new], atol=1e-6)
+
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            per_face_match(known_list, names, queries, 0.6)
+        old_ms = 1000.0 * (time.perf_counter() - start) / args.repeat
+
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            gallery.match(queries, 0.6)
+        new_ms = 1000.0 * (time.perf_counter() - start) / args.repeat
+
+        print(f"{faces:>6} {old_ms:>12.3f} {new_ms:>11.3f} {old_ms / new_ms:>8.1f}x")
+
+
+def bench_engine(args):
+    frames = []
+    for ext in IMAGE_EXTS:
+        for path in sorted(glob.glob(os.path.join(args.frames, ext))):
+            bgr = cv2.imread(path)
+            if bgr is not None:
+                frames.append(bgr)
+    if not frames:
+        print(f"[ERR] No images found in {args.frames}")
+        return
+
+    gallery = load_gallery(args.students)
+    engine = RecognitionEngine(gallery)
+    totals = {}
+    engine.add_hook(lambda stage, seconds: totals.__setitem__(stage, totals.get(stage, 0.0) + seconds))
+    engine.recognize(frames[:1])  # warm-up, excluded from timing
+    totals.clear()
+
+    processed = faces = 0
+    start = time.perf_counter()
+    for _ in range(args.passes):
+        for i in range(0, len(frames), args.batch):
+            batch = frames[i:i + args.batch]
+            results = engine.recognize(batch)
+            processed += len(batch)
+            faces += sum(len(r) for r in results)
+    elapsed = time.perf_counter() - start
+
+    print(f"\n[BENCH] Engine on {len(frames)} frames x {args.passes}, batch {args.batch}, gallery {len(gallery)} encodings")
+    for stage, total in totals.items():
+        print(f"  {stage:<7} {1000.0 * total / processed:8.2f} ms/frame")
+    print(f"  {'total':<7} {1000.0 * elapsed / processed:8.2f} ms/frame  ({processed / elapsed:.1f} frames/s, "
+          f"{faces / processed:.2f} faces/frame)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the shared recognition engine.")
+    parser.add_argument("--gallery", type=int, default=1500, help="Synthetic gallery size for the matching benchmark.")
+    parser.add_argument("--faces", type=parse_ints, default=[1, 4, 16, 64], help="Faces per batch to match.")
+    parser.add_argument("--repeat", type=int, default=200, help="Repetitions of each matching batch.")
+    parser.add_argument("--passes", type=int, default=3, help="Passes over --frames.")
+    parser.add_argument("--frames", default=None, help="Folder of gate frames for the full-engine benchmark.")
+    parser.add_argument("--students", default=STUDENTS_DIR, help="Gallery for the full-engine benchmark.")
+    parser.add_argument("--batch", type=int, default=1, help="Frames per recognize() call.")
+    args = parser.parse_args()
+
+    bench_matching(args)
+    if args.frames:
+        bench_engine(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Measure steady-state memory churn of the per-frame preprocessing, before and after buffer reuse.
+
+    python bench_frame_memory.py --width 1280 --height 720 --frames 300
+
+"naive" is the original path: cv2.resize(frame, (0, 0), ...) + cv2.cvtColor(...) on a freshly
+captured frame, plus a fresh RGB copy of every face crop. "pooled" uses FramePool for capture and
+FrameBuffers for resize/convert/crop. A synthetic camera stands in for cv2.VideoCapture, so no
+camera or face models are needed. tracemalloc reports the bytes allocated per frame, and a gc
+callback counts the garbage collections triggered while the loop runs.
+"""
+import argparse
+import gc
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+from config_template import DETECT_SCALE, FRAME_SCALE
+from face_pipeline import FrameBuffers, FramePool
+
+
+class SyntheticCamera:
+    """Mimics cv2.VideoCapture.read(): fills `image` when given, else allocates like a real capture."""
+
+    def __init__(self, width, height):
+        self._source = np.random.randint(0, 255, (height, width, 3), dtype=np.uint8)
+
+    def read(self, image=None):
+        if image is None or image.shape != self._source.shape:
+            image = np.empty_like(self._source)
+        np.copyto(image, self._source)
+        return True, image
+
+
+def fake_face_boxes(width, height, faces):
+    """Fixed full-resolution face boxes (top, right, bottom, left) so crops are the same every frame."""
+    size = min(width, height) // 5
+    return [(height // 3, (i + 1) * width // (faces + 1) + size // 2, height // 3 + size, (i + 1) * width // (faces + 1) - size // 2)
+            for i in range(faces)]
+
+
+def naive_frame(cam, boxes, scale):
+    ret, frame = cam.read()
+    small = cv2.resize(frame, (0, 0), fx=scale, fy=scale)
+    rgb_small = cv2.cvtColor(small, cv2.COLOR_BGR2RGB)
+    crops = [cv2.cvtColor(frame[t:b, l:r], cv2.COLOR_BGR2RGB) for t, r, b, l in boxes]
+    return rgb_small, crops
+
+
+def pooled_frame(cam, boxes, scale, pool, buffers):
+    ret, frame = pool.read(cam)
+    rgb_small = buffers.resize_rgb(frame, scale)
+    for t, r, b, l in boxes:
+        buffers.crop_rgb(frame, t, r, b, l)
+    return rgb_small
+
+
+def measure(step, frames, warmup=10):
+    for _ in range(warmup):
+        step()
+
+    collections = [0]
+    def on_gc(phase, info):
+        if phase == "start":
+            collections[0] += 1
+    gc.callbacks.append(on_gc)
+
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    transient = 0
+    start = time.perf_counter()
+    for _ in range(frames):
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        step()
+        transient += tracemalloc.get_traced_memory()[1] - before
+    elapsed = time.perf_counter() - start
+    tracemalloc.stop()
+    gc.callbacks.remove(on_gc)
+
+    return {
+        "bytes_per_frame": transient / frames,
+        "gc_collections": collections[0],
+        "ms_per_frame": 1000.0 * elapsed / frames,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-frame allocation benchmark for the recognition preprocessing.")
+    parser.add_argument("--width", type=int, default=1280)
+    parser.add_argument("--height", type=int, default=720)
+    parser.add_argument("--frames", type=int, default=300)
+    parser.add_argument("--faces", type=int, default=2, help="Face crops converted per frame (two-stage path).")
+    parser.add_argument("--scale", type=float, default=None, help=f"Resize factor (default FRAME_SCALE={FRAME_SCALE}; DETECT_SCALE={DETECT_SCALE}).")
+    args = parser.parse_args()
+
+    scale = args.scale or FRAME_SCALE
+    cam = SyntheticCamera(args.width, args.height)
+    boxes = fake_face_boxes(args.width, args.height, args.faces)
+    pool, buffers = FramePool(), FrameBuffers()
+
+    results = {
+        "naive": measure(lambda: naive_frame(cam, boxes, scale), args.frames),
+        "pooled": measure(lambda: pooled_frame(cam, boxes, scale, pool, buffers), args.frames),
+    }
+
+    print(f"[BENCH] {args.width}x{args.height}, scale {scale}, {args.faces} crop(s)/frame, {args.frames} frames\n")
+    print(f"{'path':<8} {'KiB alloc/frame':>16} {'gc runs':>8} {'ms/frame':>9}")
+    for name, r in results.items():
+        print(f"{name:<8} {r['bytes_per_frame'] / 1024:>16.1f} {r['gc_collections']:>8} {r['ms_per_frame']:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
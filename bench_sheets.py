@@ -0,0 +1,127 @@
+"""
+Offline load test of Google Sheets writes under quota, using the in-process FakeWorksheet.
+
+    python bench_sheets.py --events 120 --window 2 --quota 60
+
+Simulates a dismissal rush of --events checkouts against a fake sheet that allows --quota reads
+and --quota writes per --window seconds (Google's real window is 60 s; a short window keeps the
+run fast while preserving the ratios). Compares:
+
+  naive   the original per-event pattern (re-read headers cell by cell, read the name column,
+          update_cell), with APIError swallowed as before
+  client  the gate's path: events go through a batching Sheets stage (pipeline_stages.BoundedStage +
+          write_to_sheets) into sheets_client.SheetsClient (cached layout, budgeted, one write per
+          batch, backoff); while a write waits for quota, the next events pile up into the next batch
+
+and reports how many events actually reached the sheet, API calls, 429s and wall time.
+"""
+import argparse
+import time
+from datetime import datetime, timedelta
+
+import gspread
+
+from pipeline_stages import BoundedStage, write_to_sheets
+from sheets_client import CHECKOUT_LABEL, FakeWorksheet, QuotaBudget, SheetsClient
+
+
+def seed_sheet(sheet, students, days):
+    """A sheet that already holds `days` of history, like one a few weeks into term."""
+    for i, name in enumerate(students, start=3):
+        sheet.cells[(i, 1)] = name
+    start = datetime(2025, 9, 1)
+    col = 2
+    for d in range(days):
+        day = (start + timedelta(days=d)).strftime("%Y-%m-%d")
+        for label in ("Check-in", CHECKOUT_LABEL):
+            sheet.cells[(1, col)] = day
+            sheet.cells[(2, col)] = label
+            col += 1
+
+
+def naive_store(sheet, name, ts, guardian):
+    """The pre-client store_checkout(): several reads per event, one write, errors swallowed."""
+    today = ts[:10]
+    try:
+        header_row = sheet.row_values(1)
+        col_idx = None
+        for idx in range(1, len(header_row) + 1):
+            try:
+                if sheet.cell(1, idx).value == today and sheet.cell(2, idx).value == CHECKOUT_LABEL:
+                    col_idx = idx
+                    break
+            except Exception:
+                continue
+        if col_idx is None:
+            col_idx = len(header_row) + 1
+            sheet.update_cells([gspread.Cell(1, col_idx, today), gspread.Cell(2, col_idx, CHECKOUT_LABEL)])
+        name_col = sheet.col_values(1)
+        row_idx = next((i for i, c in enumerate(name_col, start=1) if c.strip().lower() == name.lower()), None)
+        if row_idx is None:
+            row_idx = len(name_col) + 1
+            sheet.update_cell(row_idx, 1, name)
+        sheet.update_cell(row_idx, col_idx, f"{ts[11:]} (Guardian: {guardian})")
+    except Exception:
+        pass
+
+
+def stored_events(sheet, students, today):
+    cols = [c for (r, c), v in sheet.cells.items() if r == 1 and v == today and sheet.cells.get((2, c)) == CHECKOUT_LABEL]
+    rows = {v: r for (r, c), v in sheet.cells.items() if c == 1}
+    return sum(1 for name in students if any(sheet.cells.get((rows.get(name), c)) for c in cols))
+
+
+def run(kind, students, args):
+    sheet = FakeWorksheet(reads_per_window=args.quota, writes_per_window=args.quota, window_sec=args.window)
+    seed_sheet(sheet, students, args.history_days)
+    today = "2025-10-19"
+    interval = args.rush / len(students)
+
+    start = time.perf_counter()
+    stage = None
+    if kind == "client":
+        budget = QuotaBudget(int(args.quota * 0.9), int(args.quota * 0.9), window_sec=args.window)
+        client = SheetsClient(sheet, budget=budget, backoff_sec=args.window / 10)
+        stage = BoundedStage("bench-sheets", lambda items: write_to_sheets(client, items), maxsize=len(students),
+                             batch=True)
+    for i, name in enumerate(students):
+        ts = f"{today} 15:{i // 60:02d}:{i % 60:02d}"
+        if stage:
+            stage.submit({"event": "checkout", "student": name, "ts": ts, "guardian": "Guardian"})
+        else:
+            naive_store(sheet, name, ts, "Guardian")
+        time.sleep(interval)
+    if stage:
+        stage.close(timeout=600)
+    elapsed = time.perf_counter() - start
+
+    return {
+        "path": kind,
+        "stored": stored_events(sheet, students, today),
+        "reads": sheet.calls["read"],
+        "writes": sheet.calls["write"],
+        "rejected": sheet.rejected,
+        "seconds": elapsed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test Sheets access against a quota-limited fake worksheet.")
+    parser.add_argument("--events", type=int, default=120, help="Checkouts in the rush.")
+    parser.add_argument("--rush", type=float, default=2.0, help="Seconds over which the events arrive.")
+    parser.add_argument("--window", type=float, default=2.0, help="Quota window in seconds (Google: 60).")
+    parser.add_argument("--quota", type=int, default=60, help="Reads and writes allowed per window.")
+    parser.add_argument("--history-days", type=int, default=20, help="Days of existing columns in the sheet.")
+    args = parser.parse_args()
+
+    students = [f"Student_{i:03d}" for i in range(args.events)]
+    print(f"[BENCH] {args.events} checkouts in {args.rush}s, quota {args.quota} reads + {args.quota} writes "
+          f"per {args.window}s, {args.history_days} days of history\n")
+    print(f"{'path':<7} {'stored':>7} {'reads':>7} {'writes':>7} {'429s':>6} {'seconds':>8}")
+    for kind in ("naive", "client"):
+        r = run(kind, students, args)
+        print(f"{r['path']:<7} {r['stored']:>4}/{len(students):<3}{r['reads']:>7} {r['writes']:>7} {r['rejected']:>6} {r['seconds']:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -14,15 +14,36 @@ load_dotenv()
 ARDUINO_SERIAL_PORT = os.getenv('ARDUINO_SERIAL_PORT', 'COM4')
 ARDUINO_BAUD_RATE = int(os.getenv('ARDUINO_BAUD_RATE', '9600'))
 
-# Parse RFID cards from comma-separated string
+# Parse RFID cards from comma-separated string. An entry may name the mode the card starts
+# ("E38ADA26:checkin", "13326C28:checkout"); cards without one use tap counting (see below).
 rfid_cards_str = os.getenv('RFID_AUTHORIZED_CARDS', 'E38ADA26,13326C28,93D6E113')
-RFID_AUTHORIZED_CARDS = [card.strip().upper() for card in rfid_cards_str.split(',')]
+RFID_AUTHORIZED_CARDS = []
+RFID_CARD_MODES = {}
+for entry in rfid_cards_str.split(','):
+    card, _, card_mode = entry.partition(':')
+    card = card.strip().upper()
+    if not card:
+        continue
+    RFID_AUTHORIZED_CARDS.append(card)
+    if card_mode.strip():
+        RFID_CARD_MODES[card] = card_mode.strip().upper()
+
+# Tap counting for cards without a mode: one tap starts check-in once MODE_SELECT_WINDOW_SEC passes
+# without a second tap; two taps inside the window start checkout. Any authorized tap stops a running mode.
+MODE_SELECT_WINDOW_SEC = float(os.getenv('MODE_SELECT_WINDOW_SEC', '2'))
+RFID_DEBOUNCE_SEC = float(os.getenv('RFID_DEBOUNCE_SEC', '0.4'))  # repeated reads of the same card inside this are ignored
+RFID_MODE_COOLDOWN_SEC = float(os.getenv('RFID_MODE_COOLDOWN_SEC', '1.5'))  # taps ignored right after a mode starts/stops
+CONTROL_TICK_SEC = float(os.getenv('CONTROL_TICK_SEC', '0.02'))  # control loop polling interval
 
 # ===================================
 # Directory and File Paths
 # ===================================
 STUDENTS_DIR = os.getenv('STUDENTS_DIR', r'D:/ScriptSanctuary/ProjectVault/AI-Based-Child-Safety-System/STUDENTS')
 OUTPUT_FILE = os.getenv('OUTPUT_FILE', r'D:/ScriptSanctuary/ProjectVault/AI-Based-Child-Safety-System/attendance_log.txt')
+# Structured attendance log: one JSON-lines file per day plus index.json (query with attendance_report.py)
+ATTENDANCE_LOG_DIR = os.getenv('ATTENDANCE_LOG_DIR', os.path.splitext(OUTPUT_FILE)[0])
+ATTENDANCE_LOG_FLUSH_EVERY = int(os.getenv('ATTENDANCE_LOG_FLUSH_EVERY', '20'))  # records buffered before a write
+ATTENDANCE_LOG_FLUSH_SEC = float(os.getenv('ATTENDANCE_LOG_FLUSH_SEC', '5'))  # max seconds a record stays buffered
 SERVICE_ACCOUNT_KEY_PATH = os.getenv('SERVICE_ACCOUNT_KEY_PATH', r'D:/ScriptSanctuary/ProjectVault/AI-Based-Child-Safety-System/ai-based-child-safety-19c12c299c33.json')
 
 # ===================================
@@ -30,6 +51,14 @@ SERVICE_ACCOUNT_KEY_PATH = os.getenv('SERVICE_ACCOUNT_KEY_PATH', r'D:/ScriptSanc
 # ===================================
 GOOGLE_SHEETS_NAME = os.getenv('GOOGLE_SHEETS_NAME', 'Attendance Records')
 SCOPES = ["https://www.googleapis.com/auth/spreadsheets", "https://www.googleapis.com/auth/drive"]
+# 'google' = real spreadsheet, 'fake' = in-process FakeWorksheet (offline testing / load tests)
+SHEETS_BACKEND = os.getenv('SHEETS_BACKEND', 'google')
+# Request budget kept below Google's per-minute quota (default quota: 60 reads and 60 writes per user per minute)
+SHEETS_READS_PER_MIN = int(os.getenv('SHEETS_READS_PER_MIN', '50'))
+SHEETS_WRITES_PER_MIN = int(os.getenv('SHEETS_WRITES_PER_MIN', '50'))
+SHEETS_MAX_RETRIES = int(os.getenv('SHEETS_MAX_RETRIES', '5'))
+SHEETS_BACKOFF_SEC = float(os.getenv('SHEETS_BACKOFF_SEC', '1'))
+SHEETS_CACHE_TTL_SEC = float(os.getenv('SHEETS_CACHE_TTL_SEC', '300'))  # re-read names/headers after this long
 
 # ===================================
 # Camera Settings
@@ -39,11 +68,42 @@ CAM_INDEX = int(os.getenv('CAM_INDEX', '0'))
 # ===================================
 # Face Recognition Settings
 # ===================================
+# Face detector backend: 'hog' (dlib, CPU), 'cnn' (dlib, GPU) or 'yunet' (OpenCV DNN, CPU)
 DETECTION_MODEL = os.getenv('DETECTION_MODEL', 'hog')
 TOLERANCE = float(os.getenv('TOLERANCE', '0.6'))
 FRAME_SCALE = float(os.getenv('FRAME_SCALE', '0.5'))
 PROCESS_EVERY_N = int(os.getenv('PROCESS_EVERY_N', '2'))
 
+# 'single' = detect and encode on the FRAME_SCALE image.
+# 'two_stage' = detect on a DETECT_SCALE image, then encode each face from the full-resolution frame.
+RECOGNITION_MODE = os.getenv('RECOGNITION_MODE', 'single')
+DETECT_SCALE = float(os.getenv('DETECT_SCALE', '0.25'))
+FACE_CROP_MARGIN = float(os.getenv('FACE_CROP_MARGIN', '0.25'))  # extra context around each face crop
+FRAME_POOL_SIZE = int(os.getenv('FRAME_POOL_SIZE', '2'))  # preallocated camera frames reused by the capture loop
+STAGE_REPORT_EVERY = int(os.getenv('STAGE_REPORT_EVERY', '100'))  # print per-stage timings every N processed frames (0 = only at mode end)
+
+# Temporal consensus: an identity must win CONSENSUS_MIN_VOTES of the last CONSENSUS_WINDOW processed
+# frames (with mean distance <= TOLERANCE) before a check-in/checkout is committed.
+CONSENSUS_WINDOW = int(os.getenv('CONSENSUS_WINDOW', '5'))
+CONSENSUS_MIN_VOTES = int(os.getenv('CONSENSUS_MIN_VOTES', '3'))
+# Faces of already-committed students are tracked by box overlap and not re-encoded while in view.
+# A track ends as soon as the face is missing from a processed frame or overlaps its last box by less
+# than SETTLED_TRACK_IOU, and the face is re-encoded every SETTLED_RECHECK_EVERY processed frames.
+SETTLED_TRACK_IOU = float(os.getenv('SETTLED_TRACK_IOU', '0.5'))
+SETTLED_RECHECK_EVERY = int(os.getenv('SETTLED_RECHECK_EVERY', '5'))
+
+# Camera readiness: recognition starts once mean frame brightness is at least CAMERA_READY_MIN_BRIGHTNESS
+# and changes by no more than CAMERA_READY_MAX_DELTA for CAMERA_READY_STABLE_FRAMES frames in a row.
+CAMERA_READY_TIMEOUT_SEC = float(os.getenv('CAMERA_READY_TIMEOUT_SEC', '3'))  # start anyway after this long
+CAMERA_READY_STABLE_FRAMES = int(os.getenv('CAMERA_READY_STABLE_FRAMES', '3'))
+CAMERA_READY_MAX_DELTA = float(os.getenv('CAMERA_READY_MAX_DELTA', '2.0'))  # 0-255 grey levels
+CAMERA_READY_MIN_BRIGHTNESS = float(os.getenv('CAMERA_READY_MIN_BRIGHTNESS', '10'))  # rejects the black first frames
+
+# OpenCV YuNet detector (used when DETECTION_MODEL=yunet)
+YUNET_MODEL_PATH = os.getenv('YUNET_MODEL_PATH', str(Path(__file__).resolve().parent / 'models' / 'face_detection_yunet_2023mar.onnx'))
+YUNET_SCORE_THRESHOLD = float(os.getenv('YUNET_SCORE_THRESHOLD', '0.8'))
+YUNET_NMS_THRESHOLD = float(os.getenv('YUNET_NMS_THRESHOLD', '0.3'))
+
 # ===================================
 # WhatsApp Settings
 # ===================================
@@ -51,10 +111,55 @@ WHATSAPP_WAIT_TIME = int(os.getenv('WHATSAPP_WAIT_TIME', '4'))
 ENTER_DELAY_SEC = int(os.getenv('ENTER_DELAY_SEC', '8'))
 WHATSAPP_TAB_CLOSE_DELAY = int(os.getenv('WHATSAPP_TAB_CLOSE_DELAY', '12'))
 
+# ===================================
+# Notification Backend Settings
+# ===================================
+# 'pywhatkit' drives WhatsApp Web in the browser (needs a focused desktop).
+# 'http' posts to a REST messaging gateway (WhatsApp Business API / SMS gateway).
+NOTIFICATION_BACKEND = os.getenv('NOTIFICATION_BACKEND', 'pywhatkit')
+NOTIFY_HTTP_URL = os.getenv('NOTIFY_HTTP_URL', '')
+NOTIFY_HTTP_TOKEN = os.getenv('NOTIFY_HTTP_TOKEN', '')
+NOTIFY_HTTP_TIMEOUT = float(os.getenv('NOTIFY_HTTP_TIMEOUT', '10'))
+NOTIFY_HTTP_POOL_SIZE = int(os.getenv('NOTIFY_HTTP_POOL_SIZE', '4'))
+NOTIFY_HTTP_MAX_RETRIES = int(os.getenv('NOTIFY_HTTP_MAX_RETRIES', '3'))
+NOTIFY_HTTP_BACKOFF_SEC = float(os.getenv('NOTIFY_HTTP_BACKOFF_SEC', '0.5'))
+
+# ===================================
+# Notification Scheduling
+# ===================================
+# Messages to the same phone within this window are merged into one (e.g. siblings).
+NOTIFY_COALESCE_WINDOW_SEC = float(os.getenv('NOTIFY_COALESCE_WINDOW_SEC', '5'))
+# Token-bucket limits: sustained messages per minute and burst size, for the whole backend and per phone.
+NOTIFY_BACKEND_RATE_PER_MIN = float(os.getenv('NOTIFY_BACKEND_RATE_PER_MIN', '30'))
+NOTIFY_BACKEND_BURST = int(os.getenv('NOTIFY_BACKEND_BURST', '5'))
+NOTIFY_PHONE_RATE_PER_MIN = float(os.getenv('NOTIFY_PHONE_RATE_PER_MIN', '2'))
+NOTIFY_PHONE_BURST = int(os.getenv('NOTIFY_PHONE_BURST', '2'))
+
+# ===================================
+# Side-effect stages (attendance log, LCD, notifications, Google Sheets)
+# ===================================
+# Each stage has a bounded queue and its own worker thread. When a queue is full its policy decides:
+# 'block' (recognition waits), 'drop_oldest' (discard the oldest item) or 'spill' (append to STAGE_SPILL_DIR).
+STAGE_QUEUE_SIZE = int(os.getenv('STAGE_QUEUE_SIZE', '64'))
+STAGE_LOG_POLICY = os.getenv('STAGE_LOG_POLICY', 'block')
+STAGE_LCD_POLICY = os.getenv('STAGE_LCD_POLICY', 'drop_oldest')
+STAGE_NOTIFY_POLICY = os.getenv('STAGE_NOTIFY_POLICY', 'spill')
+STAGE_SHEETS_POLICY = os.getenv('STAGE_SHEETS_POLICY', 'spill')
+STAGE_SPILL_DIR = os.getenv('STAGE_SPILL_DIR', 'spill')
+STAGE_RETRY_SEC = float(os.getenv('STAGE_RETRY_SEC', '5'))  # first retry delay after a failed spill-policy item (doubles up to 60s)
+STAGE_MAX_ATTEMPTS = int(os.getenv('STAGE_MAX_ATTEMPTS', '20'))  # then the item moves to STAGE_SPILL_DIR/<stage>.dead.jsonl
+STAGE_DRAIN_TIMEOUT_SEC = float(os.getenv('STAGE_DRAIN_TIMEOUT_SEC', '10'))  # per stage, at exit
+
 # Message templates
 CHECKIN_MESSAGE_TEMPLATE = os.getenv('CHECKIN_MESSAGE_TEMPLATE', '{name} is present.\\nEntry date & time: {ts}')
 CHECKOUT_MESSAGE_TEMPLATE = os.getenv('CHECKOUT_MESSAGE_TEMPLATE', '{student} checked out with Guardian: {guardian}\\nDate & Time: {ts}')
 
+# ===================================
+# Profiling (enabled with --profile)
+# ===================================
+PROFILE_DIR = os.getenv('PROFILE_DIR', 'profiles')
+PROFILE_SAMPLE_MS = float(os.getenv('PROFILE_SAMPLE_MS', '5'))  # stack sampling interval for flamegraphs
+
 # ===================================
 # Validation
 # ===================================
@@ -62,7 +167,7 @@ def validate_config():
     """Validate that required configuration is present"""
     errors = []
     
-    if not os.path.exists(SERVICE_ACCOUNT_KEY_PATH):
+    if SHEETS_BACKEND.strip().lower() == 'google' and not os.path.exists(SERVICE_ACCOUNT_KEY_PATH):
         errors.append(f"Service account key file not found: {SERVICE_ACCOUNT_KEY_PATH}")
     
     if not os.path.exists(STUDENTS_DIR):
@@ -70,7 +175,32 @@ def validate_config():
     
     if len(RFID_AUTHORIZED_CARDS) == 0:
         errors.append("No RFID authorized cards configured")
+
+    for card, card_mode in RFID_CARD_MODES.items():
+        if card_mode not in ('CHECKIN', 'CHECKOUT'):
+            errors.append(f"RFID card {card} has unknown mode '{card_mode}' (use checkin or checkout)")
+
+    if DETECTION_MODEL.strip().lower() not in ('hog', 'cnn', 'yunet'):
+        errors.append(f"Unknown DETECTION_MODEL: {DETECTION_MODEL} (use 'hog', 'cnn' or 'yunet')")
+    elif DETECTION_MODEL.strip().lower() == 'yunet' and not os.path.exists(YUNET_MODEL_PATH):
+        errors.append(f"YuNet model file not found: {YUNET_MODEL_PATH}")
+
+    if RECOGNITION_MODE not in ('single', 'two_stage'):
+        errors.append(f"Unknown RECOGNITION_MODE: {RECOGNITION_MODE} (use 'single' or 'two_stage')")
+
+    if NOTIFICATION_BACKEND.strip().lower() not in ('pywhatkit', 'http'):
+        errors.append(f"Unknown NOTIFICATION_BACKEND: {NOTIFICATION_BACKEND} (use 'pywhatkit' or 'http')")
+    elif NOTIFICATION_BACKEND.strip().lower() == 'http' and not NOTIFY_HTTP_URL:
+        errors.append("NOTIFICATION_BACKEND is 'http' but NOTIFY_HTTP_URL is not set")
+
+    if NOTIFY_BACKEND_RATE_PER_MIN <= 0 or NOTIFY_PHONE_RATE_PER_MIN <= 0:
+        errors.append("NOTIFY_BACKEND_RATE_PER_MIN and NOTIFY_PHONE_RATE_PER_MIN must be greater than 0")
     
+    for key, policy in (('STAGE_LOG_POLICY', STAGE_LOG_POLICY), ('STAGE_LCD_POLICY', STAGE_LCD_POLICY),
+                        ('STAGE_NOTIFY_POLICY', STAGE_NOTIFY_POLICY), ('STAGE_SHEETS_POLICY', STAGE_SHEETS_POLICY)):
+        if policy.strip().lower() not in ('block', 'drop_oldest', 'spill'):
+            errors.append(f"{key} must be 'block', 'drop_oldest' or 'spill' (got '{policy}')")
+
     if errors:
         print("[CONFIG ERROR] Configuration validation failed:")
         for error in errors:
@@ -86,8 +216,10 @@ if __name__ == "__main__":
     print(f"  - Authorized RFID Cards: {len(RFID_AUTHORIZED_CARDS)} cards")
     print(f"  - Students Directory: {STUDENTS_DIR}")
     print(f"  - Output File: {OUTPUT_FILE}")
+    print(f"  - Attendance Log Dir: {ATTENDANCE_LOG_DIR}")
     print(f"  - Service Account Key: {SERVICE_ACCOUNT_KEY_PATH}")
     print(f"  - Google Sheets: {GOOGLE_SHEETS_NAME}")
+    print(f"  - Notification Backend: {NOTIFICATION_BACKEND}")
     print(f"\\n[CONFIG] Validating configuration...")
     if validate_config():
         print("[CONFIG] ✓ All configuration is valid!")
@@ -0,0 +1,127 @@
+from collections import deque
+
+# Load configuration from config_template.py
+try:
+    from config_template import (
+        TOLERANCE,
+        CONSENSUS_WINDOW,
+        CONSENSUS_MIN_VOTES,
+        SETTLED_TRACK_IOU,
+        SETTLED_RECHECK_EVERY
+    )
+except ImportError as e:
+    print(f"[ERROR] Failed to import configuration in consensus.py: {e}")
+    print("Please ensure config_template.py exists and .env is configured properly.")
+    raise
+
+from face_pipeline import box_iou
+
+
+class IdentityConsensus:
+    """
+    Multi-frame evidence accumulator for attendance events.
+
+    Each processed frame contributes at most one vote per identity (its best distance).
+    An identity is committed once it has `min_votes` votes within the last `window` processed
+    frames and the mean distance of those votes is within `tolerance`. A single noisy frame
+    can therefore no longer trigger a check-in.
+
+    Committed identities become "settled": their face box is tracked by overlap, and
+    `is_settled(box)` lets the caller skip encoding/matching for that face while it stays in view.
+    A settled face is still re-encoded every `recheck_every` processed frames, and its track is
+    dropped as soon as the face is missing from a processed frame, jumps away from its last box
+    or is matched to anyone else, so the next person stepping into the same spot is recognised.
+    """
+
+    def __init__(self, window: int = CONSENSUS_WINDOW, min_votes: int = CONSENSUS_MIN_VOTES,
+                 tolerance: float = TOLERANCE, track_iou: float = SETTLED_TRACK_IOU,
+                 recheck_every: int = SETTLED_RECHECK_EVERY):
+        self.window = max(1, window)
+        self.min_votes = max(1, min(min_votes, self.window))
+        self.tolerance = tolerance
+        self.track_iou = track_iou
+        self.recheck_every = max(1, recheck_every)
+
+        self._frames = deque(maxlen=self.window)  # each: {name: (distance, box)}
+        self._committed = set()
+        self._tracks = {}  # name -> {"box", "seen", "verified", "recheck"} (frame indices)
+        self._frame_index = 0
+        self.skipped_faces = 0
+
+    def is_settled(self, box) -> bool:
+        """
+        True if `box` overlaps a settled identity whose face was verified recently enough to skip it.
+        When a re-check is due this returns False so the face is encoded again; observe() then
+        confirms the track or drops it.
+        """
+        frame_index = self._frame_index + 1  # the frame being processed
+        for track in self._tracks.values():
+            if track["seen"] == frame_index or box_iou(track["box"], box) < self.track_iou:
+                continue
+            track["box"] = box
+            track["seen"] = frame_index
+            if frame_index - track["verified"] >= self.recheck_every:
+                track["recheck"] = True
+                return False
+            self.skipped_faces += 1
+            return True
+        return False
+
+    def forget_faces(self):
+        """
+        Drops settled tracks and pending votes, e.g. after the camera was busy with something else
+        and whoever stands in front of it now must be recognised from scratch.
+        """
+        self._tracks.clear()
+        self._frames.clear()
+
+    def votes(self, name: str):
+        """(vote count, mean distance) for `name` over the current window."""
+        distances = [frame[name][0] for frame in self._frames if name in frame]
+        if not distances:
+            return 0, None
+        return len(distances), sum(distances) / len(distances)
+
+    def observe(self, matches):
+        """
+        Adds one processed frame. `matches` is a list of (box, name, distance); name is None for
+        unrecognised faces. Returns newly committed identities as (name, votes, mean_distance, box).
+        """
+        self._frame_index += 1
+        frame = {}
+        for box, name, distance in matches:
+            if name is None:
+                continue
+            if name not in frame or distance < frame[name][0]:
+                frame[name] = (distance, box)
+        self._frames.append(frame)
+
+        # Re-checked settled faces must still carry their identity; anyone else takes over the spot.
+        for name, track in list(self._tracks.items()):
+            if track["recheck"]:
+                track["recheck"] = False
+                if any(n == name and box == track["box"] for box, n, _ in matches):
+                    track["verified"] = self._frame_index
+                else:
+                    del self._tracks[name]
+
+        committed = []
+        for name, (_, box) in list(frame.items()):
+            votes, mean_distance = self.votes(name)
+            if votes < self.min_votes or mean_distance > self.tolerance:
+                continue
+            self._tracks[name] = {"box": box, "seen": self._frame_index, "verified": self._frame_index, "recheck": False}
+            # Drop this identity's evidence so a later reappearance starts from scratch.
+            for past in self._frames:
+                past.pop(name, None)
+            if name not in self._committed:
+                self._committed.add(name)
+                committed.append((name, votes, mean_distance, box))
+
+        # Forget settled faces that were not in this frame (left the view or moved too far).
+        for name in [n for n, track in self._tracks.items() if track["seen"] != self._frame_index]:
+            del self._tracks[name]
+        return committed
+
+    def is_committed(self, name: str) -> bool:
+        return name in self._committed
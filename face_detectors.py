@@ -0,0 +1,123 @@
+import os
+
+import cv2
+
+# Load configuration from config_template.py
+try:
+    from config_template import (
+        DETECTION_MODEL,
+        YUNET_MODEL_PATH,
+        YUNET_SCORE_THRESHOLD,
+        YUNET_NMS_THRESHOLD
+    )
+except ImportError as e:
+    print(f"[ERROR] Failed to import configuration in face_detectors.py: {e}")
+    print("Please ensure config_template.py exists and .env is configured properly.")
+    raise
+
+
+# ==========================
+# Detector interface
+# ==========================
+class FaceDetector:
+    """
+    Finds faces in an RGB image.
+    `detect()` returns boxes in face_recognition order: (top, right, bottom, left),
+    so the result can be passed straight to face_recognition.face_encodings().
+    """
+
+    name = "base"
+
+    def detect(self, rgb_image):
+        raise NotImplementedError
+
+
+# ==========================
+# dlib backends (via face_recognition)
+# ==========================
+class DlibHogDetector(FaceDetector):
+    """dlib HOG + linear SVM. CPU only; struggles with faces smaller than ~80 px."""
+
+    name = "hog"
+
+    def __init__(self, upsample: int = 1):
+        import face_recognition
+        self._fr = face_recognition
+        self.upsample = upsample
+
+    def detect(self, rgb_image):
+        return self._fr.face_locations(rgb_image, number_of_times_to_upsample=self.upsample, model="hog")
+
+
+class DlibCnnDetector(DlibHogDetector):
+    """dlib MMOD CNN. Accurate, but only practical with a CUDA build of dlib."""
+
+    name = "cnn"
+
+    def detect(self, rgb_image):
+        return self._fr.face_locations(rgb_image, number_of_times_to_upsample=self.upsample, model="cnn")
+
+
+# ==========================
+# OpenCV DNN backend
+# ==========================
+class YuNetDetector(FaceDetector):
+    """OpenCV FaceDetectorYN (YuNet ONNX model). Fast on CPU and finds small faces."""
+
+    name = "yunet"
+
+    def __init__(self, model_path: str = YUNET_MODEL_PATH, score_threshold: float = YUNET_SCORE_THRESHOLD,
+                 nms_threshold: float = YUNET_NMS_THRESHOLD, top_k: int = 50):
+        if not os.path.isfile(model_path):
+            raise FileNotFoundError(f"YuNet model not found: {model_path} (see models/README.md)")
+        if not hasattr(cv2, "FaceDetectorYN"):
+            raise RuntimeError("This OpenCV build has no FaceDetectorYN; OpenCV 4.5.4 or newer is required.")
+        self._detector = cv2.FaceDetectorYN.create(model_path, "", (320, 320), score_threshold, nms_threshold, top_k)
+        self._input_size = (320, 320)
+        self._bgr = None
+
+    def detect(self, rgb_image):
+        h, w = rgb_image.shape[:2]
+        if self._input_size != (w, h):
+            self._detector.setInputSize((w, h))
+            self._input_size = (w, h)
+        # YuNet is trained on BGR input; reuse one conversion buffer per input size.
+        if self._bgr is None or self._bgr.shape != rgb_image.shape:
+            self._bgr = rgb_image.copy()
+        cv2.cvtColor(rgb_image, cv2.COLOR_RGB2BGR, dst=self._bgr)
+        _, faces = self._detector.detect(self._bgr)
+        if faces is None:
+            return []
+
+        boxes = []
+        for face in faces:
+            x, y, fw, fh = (int(round(v)) for v in face[:4])
+            top, left = max(0, y), max(0, x)
+            bottom, right = min(h, y + fh), min(w, x + fw)
+            if bottom > top and right > left:
+                boxes.append((top, right, bottom, left))
+        return boxes
+
+
+# ==========================
+# Backend selection
+# ==========================
+DETECTORS = {
+    DlibHogDetector.name: DlibHogDetector,
+    DlibCnnDetector.name: DlibCnnDetector,
+    YuNetDetector.name: YuNetDetector,
+}
+
+_detectors = {}
+
+def get_face_detector(name: str = DETECTION_MODEL) -> FaceDetector:
+    """Returns a shared detector instance for `name` ('hog', 'cnn' or 'yunet')."""
+    key = name.strip().lower()
+    detector = _detectors.get(key)
+    if detector is None:
+        detector_cls = DETECTORS.get(key)
+        if detector_cls is None:
+            raise ValueError(f"Unknown DETECTION_MODEL '{name}'. Choose from: {', '.join(DETECTORS)}")
+        detector = detector_cls()
+        _detectors[key] = detector
+    return detector
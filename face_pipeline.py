@@ -0,0 +1,219 @@
+import time
+from contextlib import contextmanager
+
+import cv2
+import numpy as np
+
+# Load configuration from config_template.py
+try:
+    from config_template import (
+        FRAME_SCALE,
+        RECOGNITION_MODE,
+        DETECT_SCALE,
+        FACE_CROP_MARGIN,
+        STAGE_REPORT_EVERY,
+        FRAME_POOL_SIZE
+    )
+except ImportError as e:
+    print(f"[ERROR] Failed to import configuration in face_pipeline.py: {e}")
+    print("Please ensure config_template.py exists and .env is configured properly.")
+    raise
+
+
+# ==========================
+# Per-stage timing
+# ==========================
+class StageTimer:
+    """Accumulates wall-clock time per named stage over processed frames."""
+
+    def __init__(self, label: str, report_every: int = STAGE_REPORT_EVERY):
+        self.label = label
+        self.report_every = report_every
+        self.reset()
+
+    def reset(self):
+        self.totals = {}
+        self.frames = 0
+        self.faces = 0
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.totals[name] = self.totals.get(name, 0.0) + (time.perf_counter() - start)
+
+    def frame_done(self, faces: int):
+        """Marks the end of one processed frame; prints a summary every `report_every` frames."""
+        self.frames += 1
+        self.faces += faces
+        if self.report_every and self.frames % self.report_every == 0:
+            self.report()
+
+    def report(self):
+        if not self.frames:
+            return
+        parts = " ".join(f"{name}={1000.0 * total / self.frames:.1f}ms" for name, total in self.totals.items())
+        total_ms = 1000.0 * sum(self.totals.values()) / self.frames
+        print(f"[PERF] {self.label}: {parts} total={total_ms:.1f}ms per frame "
+              f"({self.frames} frames, {self.faces / self.frames:.2f} faces/frame)")
+
+
+class _NullTimer:
+    @contextmanager
+    def stage(self, name):
+        yield
+
+    def frame_done(self, faces):
+        pass
+
+_NULL_TIMER = _NullTimer()
+
+
+# ==========================
+# Reusable frame memory
+# ==========================
+class FramePool:
+    """
+    Small ring of preallocated camera frames. `read(cap)` lets OpenCV decode straight into the next
+    slot instead of allocating a new array per frame. A frame stays valid until the ring wraps,
+    i.e. for `size - 1` further reads.
+    """
+
+    def __init__(self, size: int = FRAME_POOL_SIZE):
+        self.size = max(1, size)
+        self._slots = [None] * self.size
+        self._next = 0
+
+    def read(self, cap):
+        slot = self._next
+        self._next = (self._next + 1) % self.size
+        ret, frame = cap.read(self._slots[slot])
+        # The first read (or a resolution change) allocates; later reads reuse that array.
+        if ret:
+            self._slots[slot] = frame
+        return ret, frame
+
+
+class FrameBuffers:
+    """Preallocated destination arrays for the per-frame resize, colour conversion and face crops."""
+
+    def __init__(self):
+        self._scaled = {}
+        self._crop = np.empty(0, dtype=np.uint8)
+
+    def resize_rgb(self, frame, scale: float, interpolation=cv2.INTER_LINEAR):
+        """Downscales a BGR frame by `scale` and converts it to RGB, writing into reused buffers."""
+        height, width = frame.shape[:2]
+        size = (max(1, int(round(width * scale))), max(1, int(round(height * scale))))
+        key = (size, frame.shape[2:], frame.dtype)
+        bufs = self._scaled.get(key)
+        if bufs is None:
+            shape = (size[1], size[0]) + frame.shape[2:]
+            bufs = (np.empty(shape, dtype=frame.dtype), np.empty(shape, dtype=frame.dtype))
+            self._scaled[key] = bufs
+        small, rgb = bufs
+        cv2.resize(frame, size, dst=small, interpolation=interpolation)
+        cv2.cvtColor(small, cv2.COLOR_BGR2RGB, dst=rgb)
+        return rgb
+
+    def crop_rgb(self, frame, top: int, right: int, bottom: int, left: int):
+        """RGB copy of a BGR frame region in a reused, contiguous scratch buffer (valid until the next call)."""
+        h, w = bottom - top, right - left
+        needed = h * w * 3
+        if self._crop.size < needed:
+            self._crop = np.empty(needed, dtype=np.uint8)
+        dst = self._crop[:needed].reshape(h, w, 3)
+        cv2.cvtColor(frame[top:bottom, left:right], cv2.COLOR_BGR2RGB, dst=dst)
+        return dst
+
+
+# ==========================
+# Box helpers
+# ==========================
+def scale_box(box, factor: float, width: int, height: int, margin: float = 0.0):
+    """Maps a (top, right, bottom, left) box by `factor`, grows it by `margin` of its size and clamps to the image."""
+    top, right, bottom, left = (v * factor for v in box)
+    pad_y = (bottom - top) * margin
+    pad_x = (right - left) * margin
+    return (
+        max(0, int(top - pad_y)),
+        min(width, int(round(right + pad_x))),
+        min(height, int(round(bottom + pad_y))),
+        max(0, int(left - pad_x)),
+    )
+
+
+def box_iou(a, b) -> float:
+    """Intersection over union of two (top, right, bottom, left) boxes."""
+    top, right = max(a[0], b[0]), min(a[1], b[1])
+    bottom, left = min(a[2], b[2]), max(a[3], b[3])
+    inter = max(0, right - left) * max(0, bottom - top)
+    area_a = (a[1] - a[3]) * (a[2] - a[0])
+    area_b = (b[1] - b[3]) * (b[2] - b[0])
+    union = area_a + area_b - inter
+    return inter / union if union > 0 else 0.0
+
+
+# ==========================
+# Detection + encoding
+# ==========================
+def locate_and_encode(frame, detector, mode: str = RECOGNITION_MODE, frame_scale: float = FRAME_SCALE,
+                      detect_scale: float = DETECT_SCALE, timer=None, buffers=None, skip=None):
+    """
+    Finds faces in a BGR camera frame and returns a list of (box, encoding).
+    Boxes are (top, right, bottom, left) in full-frame coordinates.
+
+    mode 'single':    detect and encode on one image downscaled by `frame_scale` (original behaviour).
+    mode 'two_stage': detect on an image downscaled by `detect_scale`, then landmark and encode each face
+                      on a crop of the full-resolution frame, so encoding cost grows with the number of
+                      faces instead of the number of pixels.
+
+    Pass a FrameBuffers instance as `buffers` to reuse the intermediate images across frames.
+    `skip(box)` may return True for faces that need no encoding (e.g. already settled identities);
+    those faces are left out of the result.
+    """
+    # Imported here, not at module level: importing face_recognition loads the dlib models, which
+    # warmup.py does in the background while the gate starts up.
+    import face_recognition
+
+    timer = timer or _NULL_TIMER
+    buffers = buffers or FrameBuffers()
+    height, width = frame.shape[:2]
+
+    if mode == "two_stage":
+        with timer.stage("resize"):
+            rgb_small = buffers.resize_rgb(frame, detect_scale, interpolation=cv2.INTER_AREA)
+        with timer.stage("detect"):
+            small_boxes = detector.detect(rgb_small)
+
+        results = []
+        for small_box in small_boxes:
+            box = scale_box(small_box, 1.0 / detect_scale, width, height)
+            if skip is not None and skip(box):
+                continue
+            with timer.stage("crop"):
+                ctop, cright, cbottom, cleft = scale_box(small_box, 1.0 / detect_scale, width, height, margin=FACE_CROP_MARGIN)
+                crop_rgb = buffers.crop_rgb(frame, ctop, cright, cbottom, cleft)
+                crop_box = (box[0] - ctop, box[1] - cleft, box[2] - ctop, box[3] - cleft)
+            with timer.stage("encode"):
+                encodings = face_recognition.face_encodings(crop_rgb, [crop_box])
+            if encodings:
+                results.append((box, encodings[0]))
+        timer.frame_done(len(results))
+        return results
+
+    with timer.stage("resize"):
+        rgb_small = buffers.resize_rgb(frame, frame_scale)
+    with timer.stage("detect"):
+        boxes = detector.detect(rgb_small)
+    full_boxes = [scale_box(box, 1.0 / frame_scale, width, height) for box in boxes]
+    if skip is not None:
+        kept = [i for i, box in enumerate(full_boxes) if not skip(box)]
+        boxes = [boxes[i] for i in kept]
+        full_boxes = [full_boxes[i] for i in kept]
+    with timer.stage("encode"):
+        encodings = face_recognition.face_encodings(rgb_small, boxes) if boxes else []
+    timer.frame_done(len(encodings))
+    return list(zip(full_boxes, encodings))
@@ -3,10 +3,17 @@ import time
 import threading
 import sys
 import os
+import argparse
 
 try:
     from checkin import run_checkin_mode
     from checkout import run_checkout_mode
+    from notify_scheduler import shutdown_notification_scheduler
+    from pipeline_stages import shutdown_stages
+    from attendance_log import close_attendance_log
+    from sheets_client import close_sheets_client
+    from session_profiler import enable_profiling
+    from warmup import start_model_warmup
 except ImportError as e:
     print(f"[ERROR] Failed to import checkin.py or checkout.py. Make sure they are in the same directory and saved correctly.")
     print(f"Details: {e}")
@@ -18,6 +25,11 @@ try:
         ARDUINO_SERIAL_PORT,
         ARDUINO_BAUD_RATE,
         RFID_AUTHORIZED_CARDS,
+        RFID_CARD_MODES,
+        MODE_SELECT_WINDOW_SEC,
+        RFID_DEBOUNCE_SEC,
+        RFID_MODE_COOLDOWN_SEC,
+        CONTROL_TICK_SEC,
         validate_config
     )
     print("[CONFIG] Configuration loaded successfully from config_template.py")
@@ -85,45 +97,206 @@ def read_rfid_card_from_arduino():
         print(f"[RFID ERR] Error processing Arduino RFID read: {e}")
         return None
 
-def stop_current_mode():
-    """Stops the currently active mode thread if one is running."""
-    global current_mode, mode_stop_event, active_mode_thread
+MODE_STOP_TIMEOUT_SEC = 15 # How long a mode thread gets to exit before it is given up on
+
+def request_stop_current_mode():
+    """Signals the active mode thread to stop without waiting for it."""
     if active_mode_thread and active_mode_thread.is_alive():
         print(f"[CONTROL] Signaling current mode ({current_mode}) to stop...")
         send_to_lcd(f"Stopping {current_mode}...")
         mode_stop_event.set() # Set the event to tell the thread to exit its loop
-        active_mode_thread.join(timeout=15) # Wait for the thread to finish gracefully
-        if active_mode_thread.is_alive():
-            print(f"[WARN] Current mode thread ({current_mode}) did not terminate cleanly after timeout.")
-            send_to_lcd("Mode did not stop")
-        else:
-            print(f"[CONTROL] Current mode ({current_mode}) stopped.")
+        return True
+    return False
+
+def finish_stop_current_mode(announce: bool = True):
+    """Resets the mode state once the mode thread has exited (or has been given up on)."""
+    global current_mode, active_mode_thread
+    if active_mode_thread and active_mode_thread.is_alive():
+        print(f"[WARN] Current mode thread ({current_mode}) did not terminate cleanly after timeout.")
+        send_to_lcd("Mode did not stop")
+    else:
+        print(f"[CONTROL] Current mode ({current_mode}) stopped.")
+        if announce:
             send_to_lcd("Mode Stopped!")
-        mode_stop_event.clear() # Clear the event for the next mode
-        active_mode_thread = None
-        current_mode = "NONE" # Reset the state
+    active_mode_thread = None
+    current_mode = "NONE" # Reset the state
+
+def stop_current_mode():
+    """Stops the currently active mode thread if one is running, waiting for it (used at shutdown)."""
+    if request_stop_current_mode():
+        active_mode_thread.join(timeout=MODE_STOP_TIMEOUT_SEC) # Wait for the thread to finish gracefully
+        finish_stop_current_mode()
         time.sleep(1) # Give time for message to display
         clear_lcd() # Reset LCD to default prompt
         return True
     return False
 
-def start_new_mode(mode_name, mode_function):
+def start_new_mode(mode_name, mode_function, on_ready=None):
     """Starts a new mode (check-in or check-out) in a separate thread."""
-    global current_mode, active_mode_thread
+    global current_mode, active_mode_thread, mode_stop_event
     # Ensure any previous mode is stopped before starting a new one.
     stop_current_mode()
 
     print(f"[CONTROL] Starting {mode_name} mode...")
     send_to_lcd(f"Starting {mode_name}...")
     current_mode = mode_name
+    # A fresh event per mode, so a thread that ignored its stop signal cannot be revived by the next mode.
+    mode_stop_event = threading.Event()
     # Pass the serial connection to the mode functions so they can send LCD updates
-    active_mode_thread = threading.Thread(target=mode_function, args=(mode_stop_event, send_to_lcd))
+    active_mode_thread = threading.Thread(target=mode_function, args=(mode_stop_event, send_to_lcd, on_ready))
     active_mode_thread.daemon = True # Allows main program to exit even if this thread is running
     active_mode_thread.start()
     print(f"[CONTROL] {mode_name} mode is running in the background.")
     send_to_lcd(f"{mode_name} Activating.")
 
 
+MODES = {
+    "CHECKIN": run_checkin_mode,
+    "CHECKOUT": run_checkout_mode,
+}
+
+# ==========================
+# RFID state machine
+# ==========================
+class GateController:
+    """
+    Event-driven mode control: main_control feeds it card reads and clock ticks, and nothing in it blocks.
+
+      IDLE       tap with a card bound to a mode (RFID_AUTHORIZED_CARDS "ID:checkin") -> STARTING that mode
+      IDLE       tap with an unbound card -> SELECTING
+      SELECTING  a second tap within MODE_SELECT_WINDOW_SEC -> STARTING checkout;
+                 window ends after one tap -> STARTING check-in
+      STARTING   the mode calls on_ready (camera live) -> ACTIVE; tap-to-active latency is recorded
+      STARTING/ACTIVE  tap -> STOPPING (a card bound to the other mode switches straight to it)
+      STOPPING   mode thread exits -> IDLE, or STARTING the mode to switch to
+    A mode that ends by itself (camera error, 'q' in the window) brings the controller back to IDLE.
+    """
+
+    def __init__(self, clock=time.monotonic):
+        self._clock = clock
+        self.state = "IDLE"
+        self.taps = 0
+        self.select_deadline = None
+        self.stop_deadline = None
+        self.pending_mode = None
+        self.cooldown_until = 0.0
+        self.lcd_restore_at = None
+        self.last_seen = {}  # card -> time of last read, for debouncing
+
+        # Latency of the current request: first tap -> mode started -> mode ready
+        self.tap_at = None
+        self.started_at = None
+        self.ready_at = None
+        self._generation = 0
+        self.latencies = {}  # mode -> [seconds from tap to active]
+
+    # ---------- inputs ----------
+    def handle_card(self, card_id: str, now: float):
+        last = self.last_seen.get(card_id)
+        self.last_seen[card_id] = now
+        if last is not None and now - last < RFID_DEBOUNCE_SEC:
+            return  # the reader reported the same card again
+
+        if card_id not in RFID_AUTHORIZED_CARDS:
+            print(f"[RFID] Unauthorized card scanned: {card_id}")
+            send_to_lcd("Unauthorized Card Try again.")
+            self.lcd_restore_at = now + 3
+            return
+        if now < self.cooldown_until:
+            print(f"[RFID] Card {card_id} ignored; mode change in progress.")
+            return
+
+        print(f"\n[RFID] Authorized Card {card_id} scanned!")
+        bound_mode = RFID_CARD_MODES.get(card_id)
+        if self.state == "IDLE":
+            self.tap_at = now
+            if bound_mode:
+                self._start(bound_mode, now)
+            else:
+                self.state = "SELECTING"
+                self.taps = 1
+                self.select_deadline = now + MODE_SELECT_WINDOW_SEC
+                send_to_lcd("Check-in soon. Tap again: C/O")
+        elif self.state == "SELECTING":
+            self.taps += 1
+            self._start("CHECKOUT", now)
+        elif self.state in ("STARTING", "ACTIVE"):
+            # If a mode is active, an authorized scan means stop it (or switch, for a card bound to the other mode).
+            self.tap_at = now
+            self.pending_mode = bound_mode if bound_mode and bound_mode != current_mode else None
+            send_to_lcd("Card scanned! Stopping mode...")
+            request_stop_current_mode()
+            self.state = "STOPPING"
+            self.stop_deadline = now + MODE_STOP_TIMEOUT_SEC
+            self.cooldown_until = now + RFID_MODE_COOLDOWN_SEC
+        # While STOPPING, taps are ignored until the mode has exited.
+
+    def tick(self, now: float):
+        if self.state == "SELECTING" and now >= self.select_deadline:
+            self._start("CHECKIN", now)
+        elif self.state == "STARTING":
+            if self.ready_at is not None:
+                self.state = "ACTIVE"
+                self._record_latency()
+            elif not self._mode_alive():
+                print(f"[CONTROL] {current_mode} mode ended before it became active.")
+                self._mode_exited(now)
+        elif self.state == "ACTIVE" and not self._mode_alive():
+            print(f"[CONTROL] {current_mode} mode ended on its own.")
+            self._mode_exited(now)
+        elif self.state == "STOPPING" and (not self._mode_alive() or now >= self.stop_deadline):
+            finish_stop_current_mode()
+            if self.pending_mode:
+                self._start(self.pending_mode, now)
+            else:
+                self.state = "IDLE"
+                self.lcd_restore_at = now + 1 # Give time for message to display
+
+        if self.lcd_restore_at is not None and now >= self.lcd_restore_at:
+            self.lcd_restore_at = None
+            if self.state == "IDLE":
+                clear_lcd() # Reset LCD to default prompt
+            elif self.state == "ACTIVE":
+                send_to_lcd(f"{current_mode} Active.")
+
+    # ---------- helpers ----------
+    def _mode_alive(self) -> bool:
+        return active_mode_thread is not None and active_mode_thread.is_alive()
+
+    def _start(self, mode: str, now: float):
+        self._generation += 1
+        generation = self._generation
+        self.started_at = now
+        self.ready_at = None
+        self.pending_mode = None
+        self.state = "STARTING"
+        self.cooldown_until = now + RFID_MODE_COOLDOWN_SEC
+
+        def on_ready():
+            # Called from the mode thread; ignore a late call from a mode that has since been replaced.
+            if generation == self._generation:
+                self.ready_at = self._clock()
+
+        start_new_mode(mode, MODES[mode], on_ready=on_ready)
+
+    def _mode_exited(self, now: float):
+        finish_stop_current_mode(announce=False) # Leave the mode's own last message (e.g. an error) on the LCD
+        self.state = "IDLE"
+        self.lcd_restore_at = now + 3
+
+    def _record_latency(self):
+        total = self.ready_at - self.tap_at
+        self.latencies.setdefault(current_mode, []).append(total)
+        print(f"[LATENCY] {current_mode} active {total:.2f}s after tap "
+              f"(selection {self.started_at - self.tap_at:.2f}s, startup {self.ready_at - self.started_at:.2f}s)")
+
+    def log_latency_stats(self):
+        for mode, values in self.latencies.items():
+            values = sorted(values)
+            print(f"[LATENCY] {mode}: {len(values)} activation(s), tap-to-active avg={sum(values) / len(values):.2f}s "
+                  f"median={values[len(values) // 2]:.2f}s max={values[-1]:.2f}s")
+
+
 def main_control():
     global current_mode, arduino_serial
 
@@ -132,6 +305,9 @@ def main_control():
         print("[ERROR] Configuration validation failed. Please check your .env file and config_template.py")
         sys.exit(1)
 
+    # Load and warm up the face models while we wait for the Arduino and the first RFID tap
+    start_model_warmup()
+
     # Initialize serial port for Arduino communication
     try:
         arduino_serial = serial.Serial(ARDUINO_SERIAL_PORT, ARDUINO_BAUD_RATE, timeout=0.1)
@@ -144,58 +320,22 @@ def main_control():
         print("Please check port connection, name, and permissions for Arduino.")
         sys.exit(1)
 
-    print("\n[SYSTEM] Ready. (Press Ctrl+C in terminal to force stop at any time)")
-
-    COOLDOWN_BETWEEN_SCANS = 3 # seconds to prevent rapid mode changes
-    last_card_scan_time = 0
+    print("\n[SYSTEM] Ready. Tap an authorized card: once for check-in, twice for check-out "
+          "(or use a card bound to a mode). Tap again to stop. (Ctrl+C to quit)")
 
+    controller = GateController()
     try:
         while True:
             # Always check for RFID scans from Arduino
             card_id = read_rfid_card_from_arduino()
-            current_time = time.time()
-
-            # If a card is scanned and cooldown has passed
-            if card_id and card_id in RFID_AUTHORIZED_CARDS and (current_time - last_card_scan_time > COOLDOWN_BETWEEN_SCANS):
-                last_card_scan_time = current_time
-                print(f"\n[RFID] Authorized Card {card_id} scanned!")
-
-                if current_mode != "NONE":
-                    # If a mode is active, an authorized scan means stop it.
-                    send_to_lcd("Card scanned! Stopping mode...")
-                    stop_current_mode()
-                    # After stopping, the loop will continue and show the main menu prompt below.
-                else:
-                    # No mode is active, prompt the user to choose
-                    send_to_lcd("Card Scanned! Choose Mode:1/2")
-                    time.sleep(0.5)
-
-                    print("\n[SYSTEM] Please choose an option:")
-                    print("  1. Start Check-in")
-                    print("  2. Start Check-out")
-                    choice = input("Enter your choice (1 or 2): ").strip()
-
-
-                    if choice == '1':
-                        start_new_mode("CHECKIN", run_checkin_mode)
-                    elif choice == '2':
-                        start_new_mode("CHECKOUT", run_checkout_mode)
-                    else:
-                        print("[WARN] Invalid choice. Please scan card and try again.")
-                        send_to_lcd("Invalid choice. Scan again.")
-                        time.sleep(3)
-                        clear_lcd()
-            elif card_id and card_id not in RFID_AUTHORIZED_CARDS:
-                print(f"[RFID] Unauthorized card scanned: {card_id}")
-                send_to_lcd("Unauthorized Card Try again.")
-                time.sleep(3)
-                if current_mode == "NONE":
-                    clear_lcd() # Reset LCD if no mode is active
-                else:
-                    send_to_lcd(f"{current_mode} Active.")
-
-            # Small delay to prevent the loop from using 100% CPU
-            time.sleep(0.5)
+            now = time.monotonic()
+            if card_id:
+                controller.handle_card(card_id, now)
+            controller.tick(now)
+
+            # Short poll interval so taps are picked up quickly without spinning the CPU
+            if not card_id:
+                time.sleep(CONTROL_TICK_SEC)
 
     except KeyboardInterrupt:
         print("\n[SYSTEM] KeyboardInterrupt detected. Shutting down...")
@@ -207,6 +347,11 @@ def main_control():
         time.sleep(2)
     finally:
         stop_current_mode() # Ensure any running mode is stopped on exit
+        controller.log_latency_stats()
+        shutdown_stages() # Drain queued side effects; undelivered spill-policy items stay on disk for next start
+        shutdown_notification_scheduler() # Deliver any queued parent notifications before exiting
+        close_attendance_log() # Flush buffered attendance records to disk
+        close_sheets_client() # Send any queued Google Sheets writes
         if arduino_serial and arduino_serial.is_open:
             clear_lcd() # Final clear for LCD
             arduino_serial.close()
@@ -214,4 +359,9 @@ def main_control():
         print("[SYSTEM] Program terminated.")
 
 if __name__ == "__main__":
-    main_control()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="RFID-controlled check-in/check-out gate.")
+    parser.add_argument("--profile", action="store_true", help="Profile each check-in/checkout session (cProfile + flamegraph stacks).")
+    args = parser.parse_args()
+    if args.profile:
+        enable_profiling()
+    main_control()
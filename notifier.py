@@ -0,0 +1,215 @@
+import json
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Load configuration from config_template.py
+try:
+    from config_template import (
+        NOTIFICATION_BACKEND,
+        WHATSAPP_WAIT_TIME,
+        ENTER_DELAY_SEC,
+        WHATSAPP_TAB_CLOSE_DELAY,
+        NOTIFY_HTTP_URL,
+        NOTIFY_HTTP_TOKEN,
+        NOTIFY_HTTP_TIMEOUT,
+        NOTIFY_HTTP_POOL_SIZE,
+        NOTIFY_HTTP_MAX_RETRIES,
+        NOTIFY_HTTP_BACKOFF_SEC
+    )
+except ImportError as e:
+    print(f"[ERROR] Failed to import configuration in notifier.py: {e}")
+    print("Please ensure config_template.py exists and .env is configured properly.")
+    raise
+
+
+# ==========================
+# Backend interface
+# ==========================
+class _Rejected:
+    """send() result for a message the backend refused outright (bad number, ...). Falsy like a failure,
+    but sending it again will not help, so callers should not retry it."""
+
+    def __bool__(self):
+        return False
+
+    def __repr__(self):
+        return "REJECTED"
+
+REJECTED = _Rejected()
+
+
+class NotificationBackend:
+    """Base class for anything that can deliver a text message to a phone number."""
+
+    name = "base"
+
+    def send(self, phone_number: str, message: str) -> bool:
+        """True when delivered, False on a failure worth retrying later, REJECTED on a permanent one."""
+        raise NotImplementedError
+
+    def send_many(self, items):
+        """Sends a list of (phone_number, message) pairs; returns send() results in the same order."""
+        return [self.send(phone, message) for phone, message in items]
+
+    def close(self):
+        pass
+
+
+# ==========================
+# pywhatkit (WhatsApp Web) backend
+# ==========================
+class PyWhatKitBackend(NotificationBackend):
+    """Original delivery path: opens WhatsApp Web in the browser and presses Enter via pyautogui."""
+
+    name = "pywhatkit"
+
+    def __init__(self, wait_time=WHATSAPP_WAIT_TIME, enter_delay=ENTER_DELAY_SEC, tab_close_delay=WHATSAPP_TAB_CLOSE_DELAY):
+        # Imported lazily so that headless gates using the HTTP backend do not need a display.
+        import pywhatkit
+        import pyautogui
+        self._kit = pywhatkit
+        self._gui = pyautogui
+        self.wait_time = wait_time
+        self.enter_delay = enter_delay
+        self.tab_close_delay = tab_close_delay
+        # Only one browser-driven send may own the keyboard at a time.
+        self._lock = threading.Lock()
+
+    def send(self, phone_number: str, message: str) -> bool:
+        with self._lock:
+            print(f"[INFO] Opening WhatsApp Web to message {phone_number} ...")
+            try:
+                # Set tab_close=False as we will handle it manually
+                self._kit.sendwhatmsg_instantly(phone_number, message, wait_time=self.wait_time, tab_close=False)
+                time.sleep(self.enter_delay)
+                self._gui.FAILSAFE = True
+                self._gui.press("enter")
+                print("[INFO] Message sent. Waiting to close tab...")
+
+                # Wait for a few seconds before closing the tab
+                time.sleep(self.tab_close_delay)
+                self._gui.hotkey('ctrl', 'w')
+                print("[INFO] WhatsApp tab closed.")
+                return True
+            except Exception as e:
+                print(f"[WARN] Could not send WhatsApp message automatically: {e}. Check if WhatsApp Web loaded correctly or if browser focus was lost.")
+                return False
+
+
+# ==========================
+# HTTP gateway backend
+# ==========================
+class HttpGatewayBackend(NotificationBackend):
+    """
+    Sends messages through a REST gateway (WhatsApp Business API / SMS gateway style).
+    Each message is POSTed as JSON {"to": ..., "message": ...} over a pooled keep-alive session.
+    """
+
+    name = "http"
+
+    # Status codes worth retrying: rate limited or transient server-side failures.
+    RETRY_STATUS = (429, 500, 502, 503, 504)
+
+    def __init__(self, url=NOTIFY_HTTP_URL, token=NOTIFY_HTTP_TOKEN, timeout=NOTIFY_HTTP_TIMEOUT,
+                 pool_size=NOTIFY_HTTP_POOL_SIZE, max_retries=NOTIFY_HTTP_MAX_RETRIES,
+                 backoff_sec=NOTIFY_HTTP_BACKOFF_SEC):
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        if not url:
+            raise ValueError("NOTIFY_HTTP_URL is not configured for the HTTP notification backend.")
+
+        self._requests = requests
+        self.url = url
+        self.timeout = timeout
+        self.max_retries = max(0, int(max_retries))
+        self.backoff_sec = backoff_sec
+        self.pool_size = max(1, int(pool_size))
+
+        # One session, one connection pool sized to the number of concurrent senders,
+        # so every send after the first reuses an open keep-alive connection.
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size, max_retries=0)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+        self._session.headers.update({"Content-Type": "application/json"})
+        if token:
+            self._session.headers.update({"Authorization": f"Bearer {token}"})
+
+        self._executor = ThreadPoolExecutor(max_workers=self.pool_size, thread_name_prefix="notify-http")
+
+    def _backoff_delay(self, attempt: int, retry_after=None) -> float:
+        if retry_after:
+            try:
+                return max(0.0, float(retry_after))
+            except ValueError:
+                pass
+        # Exponential backoff with full jitter.
+        return random.uniform(0, self.backoff_sec * (2 ** attempt))
+
+    def send(self, phone_number: str, message: str) -> bool:
+        payload = json.dumps({"to": phone_number, "message": message})
+        for attempt in range(self.max_retries + 1):
+            retry_after = None
+            try:
+                resp = self._session.post(self.url, data=payload, timeout=self.timeout)
+                if 200 <= resp.status_code < 300:
+                    print(f"[INFO] Message to {phone_number} accepted by gateway (HTTP {resp.status_code}).")
+                    return True
+                if resp.status_code not in self.RETRY_STATUS:
+                    print(f"[WARN] Gateway rejected message to {phone_number}: HTTP {resp.status_code} {resp.text[:200]}")
+                    return REJECTED
+                retry_after = resp.headers.get("Retry-After")
+                reason = f"HTTP {resp.status_code}"
+            except self._requests.RequestException as e:
+                reason = str(e)
+
+            if attempt < self.max_retries:
+                delay = self._backoff_delay(attempt, retry_after)
+                print(f"[WARN] Send to {phone_number} failed ({reason}); retry {attempt + 1}/{self.max_retries} in {delay:.2f}s.")
+                time.sleep(delay)
+            else:
+                print(f"[WARN] Giving up on message to {phone_number} after {attempt + 1} attempts ({reason}).")
+        return False
+
+    def send_many(self, items):
+        futures = [self._executor.submit(self.send, phone, message) for phone, message in items]
+        return [f.result() for f in futures]
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        self._session.close()
+
+
+# ==========================
+# Backend selection
+# ==========================
+BACKENDS = {
+    PyWhatKitBackend.name: PyWhatKitBackend,
+    HttpGatewayBackend.name: HttpGatewayBackend,
+}
+
+_backend = None
+_backend_lock = threading.Lock()
+
+def get_notification_backend() -> NotificationBackend:
+    """Returns the process-wide backend selected by NOTIFICATION_BACKEND, creating it on first use."""
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            backend_cls = BACKENDS.get(NOTIFICATION_BACKEND.strip().lower())
+            if backend_cls is None:
+                raise ValueError(f"Unknown NOTIFICATION_BACKEND '{NOTIFICATION_BACKEND}'. Choose from: {', '.join(BACKENDS)}")
+            _backend = backend_cls()
+            print(f"[INFO] Notification backend: {backend_cls.name}")
+        return _backend
+
+def close_notification_backend():
+    """Releases the process-wide backend (thread pool, keep-alive connections), if one was created."""
+    global _backend
+    with _backend_lock:
+        backend, _backend = _backend, None
+    if backend is not None:
+        backend.close()
@@ -0,0 +1,319 @@
+import threading
+import time
+from collections import OrderedDict, deque
+
+# Load configuration from config_template.py
+try:
+    from config_template import (
+        NOTIFY_COALESCE_WINDOW_SEC,
+        NOTIFY_BACKEND_RATE_PER_MIN,
+        NOTIFY_BACKEND_BURST,
+        NOTIFY_PHONE_RATE_PER_MIN,
+        NOTIFY_PHONE_BURST
+    )
+except ImportError as e:
+    print(f"[ERROR] Failed to import configuration in notify_scheduler.py: {e}")
+    print("Please ensure config_template.py exists and .env is configured properly.")
+    raise
+
+from notifier import REJECTED, close_notification_backend, get_notification_backend
+
+
+# ==========================
+# Token bucket
+# ==========================
+class TokenBucket:
+    """Classic token bucket: `rate` tokens per second, holding at most `capacity` tokens."""
+
+    def __init__(self, rate: float, capacity: float, now=None):
+        self.rate = rate
+        self.capacity = max(1.0, capacity)
+        self.tokens = self.capacity
+        self.updated = time.monotonic() if now is None else now
+
+    def _refill(self, now: float):
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def wait_time(self, now: float) -> float:
+        """Seconds until one token is available (0 if one is available now)."""
+        self._refill(now)
+        if self.tokens >= 1.0:
+            return 0.0
+        if self.rate <= 0:
+            return float("inf")
+        return (1.0 - self.tokens) / self.rate
+
+    def consume(self, now: float):
+        self._refill(now)
+        self.tokens -= 1.0
+
+
+# ==========================
+# Delivery outcome of one submitted message
+# ==========================
+class Delivery:
+    """
+    Returned by NotificationScheduler.submit(). `ok` is None until the message was sent (True) or
+    failed (False); `rejected` is True when the backend refused it for good (see notifier.REJECTED).
+    """
+
+    def __init__(self):
+        self._done = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks = []
+        self.ok = None
+        self.rejected = False
+
+    def _finish(self, ok: bool, rejected: bool = False):
+        with self._lock:
+            self.ok = ok
+            self.rejected = rejected
+            self._done.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback(self)
+
+    def add_done_callback(self, callback):
+        """Calls `callback(delivery)` once the outcome is known (right away if it already is)."""
+        with self._lock:
+            if not self._done.is_set():
+                self._callbacks.append(callback)
+                return
+        callback(self)
+
+    def wait(self, timeout: float = None) -> bool:
+        """True once delivered; False if delivery failed or `timeout` passed first."""
+        return self._done.wait(timeout) and bool(self.ok)
+
+
+# ==========================
+# Pending (coalesced) messages for one phone number
+# ==========================
+class _PendingBatch:
+    __slots__ = ("phone", "first_at", "items")
+
+    def __init__(self, phone: str, now: float):
+        self.phone = phone
+        self.first_at = now
+        self.items = []  # (message, key, enqueued_at, delivery)
+
+    def merged_message(self) -> str:
+        # Identical messages (e.g. the same event reported twice) are sent once.
+        messages = list(OrderedDict.fromkeys(message for message, _, _, _ in self.items))
+        return "\n\n".join(messages)
+
+    def keys(self):
+        return [key for _, key, _, _ in self.items if key]
+
+
+# ==========================
+# Scheduler
+# ==========================
+class NotificationScheduler:
+    """
+    Queues notifications and delivers them from a background thread.
+
+    - Messages for the same phone number that arrive within `coalesce_window` seconds
+      of the first one are merged into a single message (siblings checked out together).
+    - Delivery is limited by a token bucket for the whole backend and one per phone number,
+      so bursts are delayed rather than dropped.
+    - Queue depth and enqueue-to-delivery latency are tracked; see `stats()`.
+    """
+
+    def __init__(self, backend=None, coalesce_window=NOTIFY_COALESCE_WINDOW_SEC,
+                 backend_rate_per_min=NOTIFY_BACKEND_RATE_PER_MIN, backend_burst=NOTIFY_BACKEND_BURST,
+                 phone_rate_per_min=NOTIFY_PHONE_RATE_PER_MIN, phone_burst=NOTIFY_PHONE_BURST,
+                 clock=time.monotonic):
+        self.backend = backend if backend is not None else get_notification_backend()
+        self.coalesce_window = coalesce_window
+        self.phone_rate = phone_rate_per_min / 60.0
+        self.phone_burst = phone_burst
+        self._clock = clock
+
+        self._backend_bucket = TokenBucket(backend_rate_per_min / 60.0, backend_burst, now=clock())
+        self._phone_buckets = {}
+        self._pending = OrderedDict()  # phone -> _PendingBatch, oldest first
+        self._cond = threading.Condition()
+        self._stopping = False
+        self._in_flight = 0
+
+        # Metrics
+        self._latencies = deque(maxlen=500)
+        self.submitted = 0
+        self.delivered = 0
+        self.failed = 0
+        self.merged = 0
+        self.max_queue_depth = 0
+
+        self._thread = threading.Thread(target=self._run, name="notify-scheduler", daemon=True)
+        self._thread.start()
+
+    # ---------- producer side ----------
+    def submit(self, phone: str, message: str, key: str = None) -> Delivery:
+        """
+        Queues `message` for `phone` and returns its Delivery right away. `key` (e.g. the student name) is
+        only used for logging. Failed messages are not retried here; the caller decides (see pipeline_stages.py).
+        """
+        now = self._clock()
+        delivery = Delivery()
+        with self._cond:
+            batch = self._pending.get(phone)
+            if batch is None:
+                batch = _PendingBatch(phone, now)
+                self._pending[phone] = batch
+            else:
+                self.merged += 1
+            batch.items.append((message, key, now, delivery))
+            self.submitted += 1
+            self.max_queue_depth = max(self.max_queue_depth, self.queue_depth())
+            self._cond.notify()
+            depth = self.queue_depth()
+        print(f"[NOTIFY] Queued message for {key or phone} (queue depth {depth}).")
+        return delivery
+
+    def queue_depth(self) -> int:
+        """Number of individual messages waiting to be delivered."""
+        return sum(len(batch.items) for batch in self._pending.values())
+
+    # ---------- consumer side ----------
+    def _phone_bucket(self, phone: str) -> TokenBucket:
+        bucket = self._phone_buckets.get(phone)
+        if bucket is None:
+            bucket = TokenBucket(self.phone_rate, self.phone_burst, now=self._clock())
+            self._phone_buckets[phone] = bucket
+        return bucket
+
+    def _take_ready(self, now: float):
+        """Pops batches that are past their coalescing window and allowed by both rate limits.
+        Returns (batches, seconds_until_next_check)."""
+        ready = []
+        next_wake = None
+        for phone, batch in list(self._pending.items()):
+            wait = 0.0 if self._stopping else batch.first_at + self.coalesce_window - now
+            if wait <= 0:
+                wait = max(self._backend_bucket.wait_time(now), self._phone_bucket(phone).wait_time(now))
+            if wait <= 0:
+                self._backend_bucket.consume(now)
+                self._phone_bucket(phone).consume(now)
+                del self._pending[phone]
+                ready.append(batch)
+            elif wait != float("inf") and (next_wake is None or wait < next_wake):
+                next_wake = wait
+        return ready, next_wake
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    if self._stopping and not self._pending:
+                        return
+                    ready, next_wake = self._take_ready(self._clock())
+                    if ready:
+                        self._in_flight += len(ready)
+                        break
+                    self._cond.wait(timeout=next_wake)
+
+            try:
+                results = self.backend.send_many([(batch.phone, batch.merged_message()) for batch in ready])
+            except Exception as e:
+                print(f"[WARN] Notification backend error: {e}")
+                results = [False] * len(ready)
+            # Every Delivery must finish, even if a backend returns too few results.
+            results = list(results) + [False] * (len(ready) - len(results))
+
+            done = self._clock()
+            finished = []
+            with self._cond:
+                for batch, ok in zip(ready, results):
+                    names = ", ".join(batch.keys()) or batch.phone
+                    if ok:
+                        self.delivered += len(batch.items)
+                        for _, _, enqueued_at, _ in batch.items:
+                            self._latencies.append(done - enqueued_at)
+                        print(f"[NOTIFY] Delivered to {batch.phone} for {names} ({len(batch.items)} event(s)).")
+                    else:
+                        self.failed += len(batch.items)
+                        print(f"[WARN] Notification to {batch.phone} for {names} failed.")
+                    finished.extend((delivery, bool(ok), ok is REJECTED) for _, _, _, delivery in batch.items)
+                self._in_flight -= len(ready)
+                self._cond.notify_all()
+            # Outside the lock: callbacks may take other locks (the notify stage's).
+            for delivery, ok, rejected in finished:
+                delivery._finish(ok, rejected)
+
+    # ---------- lifecycle / metrics ----------
+    def flush(self, timeout: float = None) -> bool:
+        """Blocks until everything queued so far has been delivered or has failed."""
+        deadline = None if timeout is None else self._clock() + timeout
+        with self._cond:
+            while self._pending or self._in_flight:
+                remaining = None if deadline is None else deadline - self._clock()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(timeout=remaining)
+        return True
+
+    def shutdown(self, timeout: float = 30.0):
+        """Sends whatever is still queued without waiting out coalescing windows, then stops the worker thread."""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        self._thread.join(timeout=timeout)
+        if self._thread.is_alive():
+            print(f"[WARN] Notification scheduler stopped with {self.queue_depth()} message(s) undelivered.")
+
+    def stats(self) -> dict:
+        with self._cond:
+            latencies = sorted(self._latencies)
+            depth = self.queue_depth()
+        result = {
+            "submitted": self.submitted,
+            "delivered": self.delivered,
+            "failed": self.failed,
+            "merged": self.merged,
+            "queue_depth": depth,
+            "max_queue_depth": self.max_queue_depth,
+        }
+        if latencies:
+            result["latency_avg_s"] = sum(latencies) / len(latencies)
+            result["latency_p95_s"] = latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))]
+            result["latency_max_s"] = latencies[-1]
+        return result
+
+    def log_stats(self):
+        s = self.stats()
+        line = (f"[NOTIFY] submitted={s['submitted']} delivered={s['delivered']} failed={s['failed']} "
+                f"merged={s['merged']} queue={s['queue_depth']} max_queue={s['max_queue_depth']}")
+        if "latency_avg_s" in s:
+            line += f" latency avg={s['latency_avg_s']:.1f}s p95={s['latency_p95_s']:.1f}s max={s['latency_max_s']:.1f}s"
+        print(line)
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+def get_notification_scheduler() -> NotificationScheduler:
+    """Returns the process-wide scheduler (shared by check-in and checkout), starting it on first use."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = NotificationScheduler()
+        return _scheduler
+
+def log_notification_stats():
+    """Prints scheduler metrics if the scheduler has been started."""
+    scheduler = _scheduler
+    if scheduler is not None:
+        scheduler.log_stats()
+
+def shutdown_notification_scheduler(timeout: float = 30.0):
+    """Delivers anything still queued, stops the scheduler (if one was started) and closes the backend."""
+    global _scheduler
+    with _scheduler_lock:
+        scheduler, _scheduler = _scheduler, None
+    if scheduler is not None:
+        scheduler.shutdown(timeout=timeout)
+        scheduler.log_stats()
+    close_notification_backend()
@@ -0,0 +1,95 @@
+"""
+Local stand-in for an HTTP messaging gateway.
+
+Run it, point the HTTP notification backend at it, and watch the messages arrive:
+
+    python notify_stub_server.py --port 8099 --latency 0.2 --fail-rate 0.1
+    NOTIFICATION_BACKEND=http NOTIFY_HTTP_URL=http://127.0.0.1:8099/send
+
+Every accepted message is printed and appended to the --record file (JSON lines) if one is given.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubGatewayHandler(BaseHTTPRequestHandler):
+    # Keep-alive so the client's pooled session can reuse connections.
+    protocol_version = "HTTP/1.1"
+
+    def _reply(self, status: int, body: dict, headers=None):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        raw = self.rfile.read(length)
+        server = self.server
+
+        if server.latency > 0:
+            time.sleep(server.latency)
+
+        if random.random() < server.fail_rate:
+            self._reply(503, {"error": "simulated outage"}, {"Retry-After": "0"})
+            return
+
+        try:
+            payload = json.loads(raw or b"{}")
+        except ValueError:
+            self._reply(400, {"error": "invalid json"})
+            return
+        if not payload.get("to") or not payload.get("message"):
+            self._reply(400, {"error": "missing 'to' or 'message'"})
+            return
+
+        with server.lock:
+            server.received += 1
+            count = server.received
+            if server.record_path:
+                with open(server.record_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps({"ts": time.time(), **payload}) + "\n")
+        print(f"[STUB] #{count} to {payload['to']}: {payload['message']!r}")
+        self._reply(200, {"status": "queued", "id": count})
+
+    def log_message(self, format, *args):
+        # Per-request access logs are noise here; accepted messages are printed above.
+        pass
+
+
+def make_server(host="127.0.0.1", port=8099, latency=0.0, fail_rate=0.0, record_path=None):
+    server = ThreadingHTTPServer((host, port), StubGatewayHandler)
+    server.daemon_threads = True
+    server.latency = latency
+    server.fail_rate = fail_rate
+    server.record_path = record_path
+    server.received = 0
+    server.lock = threading.Lock()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stub for the HTTP notification gateway.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds to wait before answering each request.")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Fraction of requests answered with HTTP 503.")
+    parser.add_argument("--record", default=None, help="Append accepted messages to this JSON-lines file.")
+    args = parser.parse_args()
+
+    httpd = make_server(args.host, args.port, args.latency, args.fail_rate, args.record)
+    print(f"[STUB] Gateway listening on http://{args.host}:{args.port}/send (Ctrl+C to stop)")
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        print("\n[STUB] Shutting down.")
+    finally:
+        httpd.server_close()
@@ -0,0 +1,447 @@
+import heapq
+import itertools
+import json
+import os
+import threading
+import time
+from collections import deque
+
+# Load configuration from config_template.py
+try:
+    from config_template import (
+        STAGE_QUEUE_SIZE,
+        STAGE_LOG_POLICY,
+        STAGE_LCD_POLICY,
+        STAGE_NOTIFY_POLICY,
+        STAGE_SHEETS_POLICY,
+        STAGE_SPILL_DIR,
+        STAGE_RETRY_SEC,
+        STAGE_MAX_ATTEMPTS,
+        STAGE_DRAIN_TIMEOUT_SEC
+    )
+except ImportError as e:
+    print(f"[ERROR] Failed to import configuration in pipeline_stages.py: {e}")
+    print("Please ensure config_template.py exists and .env is configured properly.")
+    raise
+
+from attendance_log import get_attendance_log
+from notify_scheduler import get_notification_scheduler
+from sheets_client import get_sheets_client
+
+POLICIES = ("block", "drop_oldest", "spill")
+
+
+class PermanentError(Exception):
+    """Raised (or passed to `done`) by a handler when retrying the item cannot help, e.g. a rejected phone number."""
+
+
+# ==========================
+# Bounded stage
+# ==========================
+class BoundedStage:
+    """
+    A bounded queue with one worker thread that passes each item to `handler`.
+
+    When the queue is full, `policy` decides what `submit()` does:
+      block        wait for space (the producer slows down; nothing is lost)
+      drop_oldest  discard the oldest queued item to make room (for stale-is-useless work like the LCD)
+      spill        append the item to <spill_dir>/<name>.jsonl; the worker replays the file in order
+                   once the queue drains, and any file left by a previous run is replayed at start
+    Items must be JSON-serialisable dicts for the spill policy. A spill-policy stage retries an item whose
+    handler failed after an exponential backoff (up to 60 s) while later items carry on, so an outage backs
+    work up onto disk instead of losing it. After `max_attempts` tries, or at once on a PermanentError, the
+    item goes to <spill_dir>/<name>.dead.jsonl instead. Other policies count the failure and move on.
+
+    An item counts as handled only when its handler has finished the real work, so handlers must not
+    just pass it to another queue. Handlers come in three shapes:
+      handler(item)              the default; returns when done, raises on failure
+      handler(items)             batch=True: up to `maxsize` queued items at once; returns the ones that failed
+      handler(item, done)        deferred=True: starts the work and returns at once; `done(error=None)` is
+                                 called later, from any thread. The worker moves on to the next item meanwhile.
+    Items inside the handler (or waiting for a retry) still count towards depth(), and the worker takes no
+    new items while `maxsize` of them are outstanding, so the overflow policy sees the real backlog.
+    Delivery is at-least-once: items still in flight when close() gives up are spilled too.
+    """
+
+    def __init__(self, name: str, handler, maxsize: int = STAGE_QUEUE_SIZE, policy: str = "block",
+                 spill_dir: str = STAGE_SPILL_DIR, retry_sec: float = STAGE_RETRY_SEC,
+                 max_attempts: int = STAGE_MAX_ATTEMPTS, batch: bool = False, deferred: bool = False):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown overflow policy '{policy}' for stage '{name}'. Choose from: {', '.join(POLICIES)}")
+        self.name = name
+        self.handler = handler
+        self.maxsize = max(1, maxsize)
+        self.policy = policy
+        self.spill_path = os.path.join(spill_dir, f"{name}.jsonl")
+        self.dead_path = os.path.join(spill_dir, f"{name}.dead.jsonl")
+        self.retry_sec = retry_sec
+        self.max_attempts = max(1, max_attempts)
+        self.batch = batch
+        self.deferred = deferred
+
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._closing = False
+        self._in_flight = {}  # token -> item handed to the handler
+        self._retry = []  # heap of (due, token, item) waiting to be retried
+        self._tokens = itertools.count()
+        self._spilled = 0  # items currently on disk
+
+        # Metrics
+        self.submitted = 0
+        self.processed = 0
+        self.failed = 0
+        self.retries = 0
+        self.dead = 0
+        self.dropped = 0
+        self.spilled_total = 0
+        self.high_water = 0
+
+        if policy == "spill" and os.path.exists(self.spill_path):
+            with open(self.spill_path, "r", encoding="utf-8") as f:
+                self._spilled = sum(1 for line in f if line.strip())
+            if self._spilled:
+                print(f"[STAGE] {name}: replaying {self._spilled} item(s) spilled by a previous run.")
+
+        self._thread = threading.Thread(target=self._run, name=f"stage-{name}", daemon=True)
+        self._thread.start()
+
+    # ---------- producer side ----------
+    def submit(self, item) -> bool:
+        """Queues `item`; returns False if it was not accepted (stage closed)."""
+        with self._cond:
+            if self._closing:
+                return False
+            self.submitted += 1
+            if self.policy == "spill" and (self._spilled or len(self._queue) >= self.maxsize):
+                # Once anything is on disk, newer items follow it there to keep the order.
+                self._spill([item])
+            else:
+                while len(self._queue) >= self.maxsize:
+                    if self.policy == "drop_oldest":
+                        self._queue.popleft()
+                        self.dropped += 1
+                    else:
+                        self._cond.wait()
+                        if self._closing:
+                            return False
+                self._queue.append(item)
+            self.high_water = max(self.high_water, self.depth())
+            self._cond.notify_all()
+        return True
+
+    def depth(self) -> int:
+        """Items not yet handled: queued in memory, on disk, inside the handler or waiting for a retry."""
+        return len(self._queue) + self._spilled + len(self._in_flight) + len(self._retry)
+
+    def _spill(self, items):
+        os.makedirs(os.path.dirname(self.spill_path) or ".", exist_ok=True)
+        with open(self.spill_path, "a", encoding="utf-8") as f:
+            for item in items:
+                f.write(json.dumps(item, ensure_ascii=False) + "\n")
+        self._spilled += len(items)
+        self.spilled_total += len(items)
+
+    def _reload(self, count: int):
+        """Moves up to `count` spilled items back into memory (oldest first)."""
+        with open(self.spill_path, "r", encoding="utf-8") as f:
+            lines = [line for line in f if line.strip()]
+        head, rest = lines[:count], lines[count:]
+        if rest:
+            tmp_path = self.spill_path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.writelines(rest)
+            os.replace(tmp_path, self.spill_path)
+        else:
+            os.remove(self.spill_path)
+        self._spilled = len(rest)
+        for line in head:
+            try:
+                self._queue.append(json.loads(line))
+            except ValueError:
+                self.failed += 1
+                print(f"[WARN] Stage {self.name}: skipped corrupt spilled item.")
+
+    def _dead_letter(self, item, error):
+        """Sets a spill-policy item aside for good; append lines back to <name>.jsonl to give them one more try."""
+        os.makedirs(os.path.dirname(self.dead_path) or ".", exist_ok=True)
+        with open(self.dead_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(dict(item, _error=str(error)), ensure_ascii=False) + "\n")
+        self.dead += 1
+        print(f"[WARN] Stage {self.name}: gave up on an item after {item.get('_attempts', 1)} attempt(s) ({error}); "
+              f"kept in {self.dead_path}")
+
+    # ---------- consumer side ----------
+    def _take(self):
+        """Waits (lock held) for the next items to hand to the handler; None once the stage is closing."""
+        limit = self.maxsize if self.batch else 1
+        while not self._closing:
+            now = time.monotonic()
+            items = []
+            while self._retry and self._retry[0][0] <= now and len(items) < limit:
+                items.append(heapq.heappop(self._retry)[2])
+            # New work only while fewer than `maxsize` items are outstanding.
+            room = self.maxsize - len(self._in_flight) - len(self._retry) - len(items)
+            if not self._queue and self._spilled and room > 0:
+                self._reload(room)
+            while self._queue and room > 0 and len(items) < limit:
+                items.append(self._queue.popleft())
+                room -= 1
+            if items:
+                return items
+            self._cond.wait(timeout=self._retry[0][0] - now if self._retry else None)
+        return None
+
+    def _handle(self, tokens, items):
+        """Runs a synchronous handler; returns {token: error} for the items that failed."""
+        try:
+            if self.batch:
+                failed = {id(item) for item in (self.handler(items) or [])}
+                return {token: RuntimeError("not handled") for token, item in zip(tokens, items) if id(item) in failed}
+            self.handler(items[0])
+            return {}
+        except Exception as e:
+            print(f"[WARN] Stage {self.name} failed to process {len(items)} item(s): {e}")
+            return {token: e for token in tokens}
+
+    def _complete(self, token, error=None):
+        """
+        Records the outcome of one handed-over item: done, retry later, dead-letter or failed.
+        Returns (attempt, delay) when a retry was scheduled, else None.
+        """
+        retry = None
+        with self._cond:
+            item = self._in_flight.pop(token, None)
+            if item is None:
+                return None  # close() gave up waiting and already kept it
+            if error is None:
+                self.processed += 1
+            elif self.policy != "spill":
+                self.failed += 1
+            else:
+                item["_attempts"] = item.get("_attempts", 0) + 1
+                if isinstance(error, PermanentError) or item["_attempts"] >= self.max_attempts:
+                    self._dead_letter(item, error)
+                else:
+                    self.retries += 1
+                    delay = min(60.0, self.retry_sec * 2 ** (item["_attempts"] - 1))
+                    heapq.heappush(self._retry, (time.monotonic() + delay, token, item))
+                    retry = (item["_attempts"], delay)
+            self._cond.notify_all()
+        return retry
+
+    def _deferred_done(self, token, error=None):
+        retry = self._complete(token, error)
+        if retry:
+            print(f"[WARN] Stage {self.name}: item failed ({error}); attempt {retry[0]}/{self.max_attempts}, "
+                  f"retrying in {retry[1]:.1f}s.")
+
+    def _run(self):
+        while True:
+            with self._cond:
+                items = self._take()
+                if items is None:
+                    return
+                tokens = [next(self._tokens) for _ in items]
+                self._in_flight.update(zip(tokens, items))
+                self._cond.notify_all()
+
+            if self.deferred:
+                for token, item in zip(tokens, items):
+                    try:
+                        self.handler(item, lambda error=None, token=token: self._deferred_done(token, error))
+                    except Exception as e:
+                        print(f"[WARN] Stage {self.name} failed to start an item: {e}")
+                        self._deferred_done(token, e)
+                continue
+
+            errors = self._handle(tokens, items)
+            retries = [r for r in (self._complete(token, errors.get(token)) for token in tokens) if r]
+            if retries:
+                print(f"[WARN] Stage {self.name}: retrying {len(retries)} item(s) in {min(d for _, d in retries):.1f}s "
+                      f"(attempt {max(a for a, _ in retries)}/{self.max_attempts}).")
+
+    # ---------- lifecycle / metrics ----------
+    def flush(self, timeout: float = None) -> bool:
+        """Blocks until everything submitted so far (including spilled and retried items) has been handled."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self.depth():
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(timeout=remaining)
+        return True
+
+    def discard(self) -> int:
+        """Drops everything queued in memory (not spilled items); returns how many were dropped."""
+        with self._cond:
+            count = len(self._queue)
+            self._queue.clear()
+            self.dropped += count
+            self._cond.notify_all()
+        return count
+
+    def close(self, timeout: float = STAGE_DRAIN_TIMEOUT_SEC):
+        """Stops accepting items, drains for up to `timeout` seconds, then spills or drops the rest."""
+        drained = self.flush(timeout)
+        with self._cond:
+            self._closing = True
+            left = list(self._queue)
+            self._queue.clear()
+            if self.policy == "spill" and (self._in_flight or self._retry):
+                # Oldest first; in-flight items may still be delivered, so they can arrive twice.
+                left = ([item for _, item in sorted(self._in_flight.items())] +
+                        [item for _, _, item in sorted(self._retry, key=lambda r: r[1])] + left)
+                self._in_flight.clear()
+                self._retry.clear()
+            if left and self.policy == "spill":
+                # Written ahead of what is already on disk would break the order, so rewrite the file.
+                existing = []
+                if os.path.exists(self.spill_path):
+                    with open(self.spill_path, "r", encoding="utf-8") as f:
+                        existing = [line for line in f if line.strip()]
+                self._spilled = 0
+                if existing:
+                    os.remove(self.spill_path)
+                self._spill(left)
+                with open(self.spill_path, "a", encoding="utf-8") as f:
+                    f.writelines(existing)
+                self._spilled += len(existing)
+            elif left:
+                self.dropped += len(left)
+            self._cond.notify_all()
+        self._thread.join(timeout=1.0)
+        if not drained:
+            where = f"kept in {self.spill_path}" if self.policy == "spill" else "dropped"
+            print(f"[WARN] Stage {self.name} did not drain in {timeout:.0f}s; {self.depth() or len(left)} item(s) {where}.")
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "policy": self.policy,
+                "depth": self.depth(),
+                "high_water": self.high_water,
+                "submitted": self.submitted,
+                "processed": self.processed,
+                "failed": self.failed,
+                "retries": self.retries,
+                "dead": self.dead,
+                "dropped": self.dropped,
+                "spilled": self.spilled_total,
+            }
+
+    def log_stats(self):
+        s = self.stats()
+        print(f"[STAGE] {self.name} ({s['policy']}, max {self.maxsize}): depth={s['depth']} high_water={s['high_water']} "
+              f"submitted={s['submitted']} processed={s['processed']} failed={s['failed']} retries={s['retries']} "
+              f"dead={s['dead']} dropped={s['dropped']} spilled={s['spilled']}")
+
+
+# ==========================
+# Side-effect stages (recognised identity -> log, LCD, notification, Sheets)
+# ==========================
+_lcd_sink = print
+
+def set_lcd_sink(send_to_lcd_func):
+    """Where the LCD stage writes; each mode points it at the send_to_lcd function it was given."""
+    global _lcd_sink
+    _lcd_sink = send_to_lcd_func
+
+def show_on_lcd(text: str, hold: float = 0.0):
+    """Queues an LCD message; `hold` seconds pass before the next queued message replaces it."""
+    get_stage("lcd").submit({"text": text, "hold": hold})
+
+def discard_pending_lcd():
+    """
+    Drops LCD messages a mode queued but never showed, so they cannot overwrite what comes after the
+    mode. It does not touch the screen; errors meant to stay visible go straight to send_to_lcd.
+    """
+    if "lcd" in _stages:
+        _stages["lcd"].discard()
+
+def record_attendance(event: str, student: str, ts: str, guardian: str = None, phone: str = None, message: str = None):
+    """Queues everything that follows a committed check-in/checkout: attendance log, parent notification and Sheets."""
+    item = {"event": event, "student": student, "ts": ts}
+    if guardian:
+        item["guardian"] = guardian
+    get_stage("log").submit(item)
+    if phone and phone.strip() and message and message.strip():
+        get_stage("notify").submit({"phone": phone.strip(), "message": message, "key": student})
+    else:
+        print(f"[WARN] No phone number or message for {student}; skipping notification.")
+    get_stage("sheets").submit(dict(item))
+
+def _handle_log(item):
+    get_attendance_log().append(item["event"], item["student"], guardian=item.get("guardian"), ts=item["ts"])
+
+def _handle_lcd(item):
+    _lcd_sink(item["text"])
+    # Holding here keeps the message readable without pausing recognition.
+    if item.get("hold"):
+        time.sleep(item["hold"])
+
+def _handle_notify(item, done):
+    # Handed over at once so the scheduler can coalesce siblings and rate-limit each phone on its own;
+    # the stage counts the item as in flight until the scheduler reports the outcome.
+    def finished(delivery):
+        if delivery.ok:
+            done()
+        elif delivery.rejected:
+            done(PermanentError("rejected by the notification backend"))
+        else:
+            done(RuntimeError("notification not delivered"))
+    delivery = get_notification_scheduler().submit(item["phone"], item["message"], key=item.get("key"))
+    delivery.add_done_callback(finished)
+
+def _handle_sheets(items):
+    client = get_sheets_client()
+    if client is None:
+        raise RuntimeError("Google Sheets is unavailable")
+    return write_to_sheets(client, items)
+
+def write_to_sheets(client, items):
+    """Stores a batch of attendance events in `client` and sends them as one write (bench_sheets.py drives this too)."""
+    for item in items:
+        if item["event"] == "checkin":
+            client.store_checkin(item["student"], item["ts"])
+        else:
+            client.store_checkout(item["student"], item["ts"], item.get("guardian"))
+    # Done only once Google has the cells; a retried batch rewrites the same cells.
+    if not client.flush():
+        raise RuntimeError("Google Sheets write failed")
+    return []
+
+# name -> (handler, policy, handler shape passed to BoundedStage)
+STAGES = {
+    "log": (_handle_log, STAGE_LOG_POLICY, {}),
+    "lcd": (_handle_lcd, STAGE_LCD_POLICY, {}),
+    "notify": (_handle_notify, STAGE_NOTIFY_POLICY, {"deferred": True}),
+    "sheets": (_handle_sheets, STAGE_SHEETS_POLICY, {"batch": True}),
+}
+
+_stages = {}
+_stages_lock = threading.Lock()
+
+def get_stage(name: str) -> BoundedStage:
+    """Returns the process-wide stage `name` ('log', 'lcd', 'notify' or 'sheets'), starting it on first use."""
+    with _stages_lock:
+        stage = _stages.get(name)
+        if stage is None:
+            handler, policy, shape = STAGES[name]
+            stage = BoundedStage(name, handler, policy=policy.strip().lower(), **shape)
+            _stages[name] = stage
+        return stage
+
+def log_stage_stats():
+    for stage in list(_stages.values()):
+        stage.log_stats()
+
+def shutdown_stages(timeout: float = STAGE_DRAIN_TIMEOUT_SEC):
+    """Drains and stops every started stage; undelivered spill-policy items stay on disk for the next run."""
+    with _stages_lock:
+        stages = list(_stages.values())
+        _stages.clear()
+    for stage in stages:
+        stage.close(timeout)
+        stage.log_stats()
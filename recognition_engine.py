@@ -0,0 +1,260 @@
+import glob
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+import numpy as np
+
+# Load configuration from config_template.py
+try:
+    from config_template import (
+        STUDENTS_DIR,
+        TOLERANCE,
+        FRAME_SCALE,
+        RECOGNITION_MODE,
+        DETECT_SCALE
+    )
+except ImportError as e:
+    print(f"[ERROR] Failed to import configuration in recognition_engine.py: {e}")
+    print("Please ensure config_template.py exists and .env is configured properly.")
+    raise
+
+from face_detectors import get_face_detector
+from face_pipeline import FrameBuffers, locate_and_encode
+
+IMAGE_EXTS = ("*.jpg", "*.jpeg", "*.png", "*.bmp", "*.webp")
+
+
+# ==========================
+# Gallery
+# ==========================
+class Gallery:
+    """
+    Enrolled face encodings with their identities, stored as one (N, 128) matrix so a whole
+    batch of faces is matched with a single matrix product instead of one distance call per face.
+    A student gallery also carries each student's phone number and guardian gallery.
+    """
+
+    def __init__(self, encodings, names, phones=None, guardians=None):
+        self.encodings = np.asarray(encodings, dtype=np.float64).reshape(-1, 128)
+        self.names = list(names)
+        self.phones = phones or {}
+        self.guardians = guardians or {}
+        self._sq_norms = np.einsum("ij,ij->i", self.encodings, self.encodings)
+
+    def __len__(self):
+        return len(self.names)
+
+    @property
+    def identities(self):
+        return sorted(set(self.names))
+
+    def phone_of(self, student: str) -> str:
+        return self.phones.get(student, "").strip()
+
+    def guardians_of(self, student: str) -> "Gallery":
+        return self.guardians.get(student) or Gallery([], [])
+
+    def distances(self, encodings) -> np.ndarray:
+        """(M, N) Euclidean distances between M query encodings and the N enrolled ones (same metric as face_distance)."""
+        queries = np.asarray(encodings, dtype=np.float64).reshape(-1, 128)
+        sq = np.einsum("ij,ij->i", queries, queries)[:, None] + self._sq_norms[None, :] - 2.0 * queries @ self.encodings.T
+        return np.sqrt(np.maximum(sq, 0.0))
+
+    def match(self, encodings, tolerance: float = TOLERANCE):
+        """Best (identity, distance) per query encoding; identity is None when the best distance exceeds `tolerance`."""
+        if len(encodings) == 0:
+            return []
+        if len(self) == 0:
+            return [(None, None)] * len(encodings)
+        dist = self.distances(encodings)
+        best = np.argmin(dist, axis=1)
+        results = []
+        for row, idx in enumerate(best):
+            d = float(dist[row, idx])
+            results.append((self.names[idx] if d <= tolerance else None, d))
+        return results
+
+    # ---------- loading ----------
+    @staticmethod
+    def _encode_images(paths, detector, owner):
+        import face_recognition  # deferred like in face_pipeline.py, so warmup.py loads the models
+
+        encodings, labels = [], []
+        for img_path in paths:
+            try:
+                image = face_recognition.load_image_file(img_path)
+                boxes = detector.detect(image)
+                if not boxes:
+                    print(f"[WARN] {owner}: no face in {img_path}, skipped.")
+                    continue
+                encodings.append(face_recognition.face_encodings(image, known_face_locations=boxes)[0])
+                labels.append(os.path.splitext(os.path.basename(img_path))[0])
+            except Exception as e:
+                print(f"[WARN] {owner}: failed to process {img_path} ({e})")
+        return encodings, labels
+
+    @classmethod
+    def from_dir(cls, students_dir: str = STUDENTS_DIR, detector=None) -> "Gallery":
+        """
+        Loads STUDENTS_DIR/<student>/*.jpg (files with 'guardian' in the name are skipped),
+        <student>/phone.txt and <student>/guardian/<guardian name>.jpg.
+        """
+        detector = detector or get_face_detector()
+        encodings, names, phones, guardians = [], [], {}, {}
+
+        if not os.path.isdir(students_dir):
+            print(f"[ERR] STUDENTS_DIR not found: {students_dir}")
+            return cls([], [])
+
+        for student in sorted(os.listdir(students_dir)):
+            student_path = os.path.join(students_dir, student)
+            if not os.path.isdir(student_path):
+                continue
+
+            phone_file = os.path.join(student_path, "phone.txt")
+            if os.path.exists(phone_file):
+                try:
+                    with open(phone_file, "r", encoding="utf-8") as f:
+                        phone = f.read().strip()
+                        if phone:
+                            phones[student] = phone
+                except Exception as e:
+                    print(f"[WARN] {student}: failed to read phone.txt ({e})")
+
+            paths = [p for ext in IMAGE_EXTS for p in glob.glob(os.path.join(student_path, ext))
+                     if "guardian" not in os.path.basename(p).lower()]
+            if not paths:
+                print(f"[WARN] {student}: no images found")
+            student_encs, _ = cls._encode_images(paths, detector, student)
+            encodings.extend(student_encs)
+            names.extend([student] * len(student_encs))
+
+            guardian_dir = os.path.join(student_path, "guardian")
+            if os.path.isdir(guardian_dir):
+                paths = [p for ext in IMAGE_EXTS for p in glob.glob(os.path.join(guardian_dir, ext))]
+                if not paths:
+                    print(f"[WARN] {student}: no guardian images found")
+                guardian_encs, guardian_names = cls._encode_images(paths, detector, f"guardian of {student}")
+                guardians[student] = cls(guardian_encs, guardian_names)
+
+        print(f"[INFO] Total encodings: {len(encodings)}; distinct students: {len(set(names))}; "
+              f"students with guardians: {len(guardians)}")
+        return cls(encodings, names, phones, guardians)
+
+
+def _dir_signature(students_dir: str):
+    """Cheap fingerprint of the gallery folder: every file's path, size and modification time."""
+    signature = []
+    for root, _dirs, files in os.walk(students_dir):
+        for name in files:
+            path = os.path.join(root, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            signature.append((path, st.st_size, st.st_mtime_ns))
+    return tuple(sorted(signature))
+
+_galleries = {}
+_galleries_lock = threading.Lock()
+
+def load_gallery(students_dir: str = STUDENTS_DIR, detector=None) -> Gallery:
+    """
+    Returns the gallery for `students_dir`, encoding the images only when the folder changed since the
+    last call with the same detector, so switching between check-in and checkout does not re-encode everyone.
+    """
+    detector = detector or get_face_detector()
+    key = (os.path.abspath(students_dir), type(detector).__name__)
+    signature = _dir_signature(students_dir)
+    with _galleries_lock:
+        cached = _galleries.get(key)
+        if cached is not None and cached[0] == signature:
+            print(f"[INFO] Reusing loaded gallery ({len(cached[1])} encodings).")
+            return cached[1]
+        gallery = Gallery.from_dir(students_dir, detector)
+        _galleries[key] = (signature, gallery)
+        return gallery
+
+
+# ==========================
+# Engine
+# ==========================
+class _HookedTimer:
+    """Forwards stage timings to the caller's timer and to every registered hook."""
+
+    def __init__(self, timer, hooks):
+        self.timer = timer
+        self.hooks = hooks
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            with self.timer.stage(name) if self.timer is not None else nullcontext():
+                yield
+        finally:
+            if self.hooks:
+                elapsed = time.perf_counter() - start
+                for hook in self.hooks:
+                    hook(name, elapsed)
+
+    def frame_done(self, faces):
+        if self.timer is not None:
+            self.timer.frame_done(faces)
+
+
+class RecognitionEngine:
+    """
+    The one detect -> encode -> match path used by check-in, checkout and the tools.
+
+        engine = RecognitionEngine(load_gallery())
+        for box, identity, distance in engine.recognize([frame])[0]: ...
+
+    Stages ('resize', 'detect', 'crop', 'encode', 'match') are timed into `timer` (a StageTimer) and
+    reported to hooks added with add_hook(fn), called as fn(stage_name, seconds).
+    """
+
+    def __init__(self, gallery: Gallery, detector=None, mode: str = RECOGNITION_MODE, frame_scale: float = FRAME_SCALE,
+                 detect_scale: float = DETECT_SCALE, tolerance: float = TOLERANCE, timer=None, buffers=None):
+        self.gallery = gallery
+        self.detector = detector or get_face_detector()
+        self.mode = mode
+        self.frame_scale = frame_scale
+        self.detect_scale = detect_scale
+        self.tolerance = tolerance
+        self.buffers = buffers or FrameBuffers()
+        self.hooks = []
+        self._timer = _HookedTimer(timer, self.hooks)
+
+    def add_hook(self, hook):
+        self.hooks.append(hook)
+
+    def recognize(self, frames, gallery: Gallery = None, skip=None):
+        """
+        Recognises every face in a batch of BGR frames. Returns one list per frame of
+        (box, identity, distance); identity is None when no enrolled face is within tolerance.
+        `gallery` overrides the engine's gallery (e.g. one student's guardians); `skip(box)` may
+        return True for faces that need no encoding (already settled identities).
+        """
+        gallery = self.gallery if gallery is None else gallery
+        located = [locate_and_encode(frame, self.detector, mode=self.mode, frame_scale=self.frame_scale,
+                                     detect_scale=self.detect_scale, timer=self._timer, buffers=self.buffers, skip=skip)
+                   for frame in frames]
+
+        # Match the faces of all frames against the gallery in one go.
+        encodings = [enc for faces in located for _box, enc in faces]
+        with self._timer.stage("match"):
+            matches = gallery.match(encodings, self.tolerance)
+
+        results = []
+        i = 0
+        for faces in located:
+            results.append([(box, matches[i + n][0], matches[i + n][1]) for n, (box, _enc) in enumerate(faces)])
+            i += len(faces)
+        return results
+
+    def recognize_frame(self, frame, gallery: Gallery = None, skip=None):
+        """recognize() for a single frame."""
+        return self.recognize([frame], gallery=gallery, skip=skip)[0]
@@ -0,0 +1,142 @@
+import cProfile
+import functools
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+# Load configuration from config_template.py
+try:
+    from config_template import (
+        PROFILE_DIR,
+        PROFILE_SAMPLE_MS
+    )
+except ImportError as e:
+    print(f"[ERROR] Failed to import configuration in session_profiler.py: {e}")
+    print("Please ensure config_template.py exists and .env is configured properly.")
+    raise
+
+# Off by default; enable_profiling() is called by the --profile command-line option.
+_enabled = False
+_out_dir = PROFILE_DIR
+
+# cProfile names of explicit sleeps, reported as part of the blocked time.
+SLEEP_FUNCTIONS = ("<built-in method time.sleep>",)
+
+
+def enable_profiling(out_dir: str = PROFILE_DIR):
+    global _enabled, _out_dir
+    _enabled = True
+    _out_dir = out_dir
+    print(f"[PROFILE] Profiling enabled; reports go to {os.path.abspath(out_dir)}")
+
+def profiling_enabled() -> bool:
+    return _enabled
+
+
+# ==========================
+# Stack sampler (for flamegraphs)
+# ==========================
+class StackSampler:
+    """Samples one thread's Python stack every `interval` seconds and counts collapsed stacks."""
+
+    def __init__(self, thread_id: int, interval: float):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}")
+                frame = frame.f_back
+            self.stacks[";".join(reversed(names))] += 1
+
+    def write_folded(self, path: str):
+        """Brendan Gregg collapsed-stack format: 'a;b;c count' (flamegraph.pl, speedscope, inferno)."""
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+# ==========================
+# Session profiling
+# ==========================
+def _sleep_seconds(stats: pstats.Stats) -> float:
+    total = 0.0
+    for (_, _, func_name), (_, _, tottime, _, _) in stats.stats.items():
+        if func_name in SLEEP_FUNCTIONS:
+            total += tottime
+    return total
+
+def _run_profiled(name: str, fn, *args, **kwargs):
+    os.makedirs(_out_dir, exist_ok=True)
+    stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+    base = os.path.join(_out_dir, f"{name}-{stamp}")
+
+    profiler = cProfile.Profile()
+    sampler = StackSampler(threading.get_ident(), PROFILE_SAMPLE_MS / 1000.0)
+    sampler.start()
+    start = time.perf_counter()
+    # CPU time of this thread only; everything else (sleeps, Event/Condition waits, cap.read(),
+    # cv2.waitKey, network) is time the mode spent blocked.
+    cpu_start = time.thread_time()
+    profiler.enable()
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        profiler.disable()
+        compute = time.thread_time() - cpu_start
+        wall = time.perf_counter() - start
+        blocked = max(0.0, wall - compute)
+        sampler.stop()
+
+        profiler.dump_stats(base + ".prof")
+        sampler.write_folded(base + ".folded")
+
+        stats = pstats.Stats(profiler)
+        slept = _sleep_seconds(stats)
+        top = io.StringIO()
+        stats.stream = top
+        stats.sort_stats("cumulative").print_stats(15)
+        with open(base + ".txt", "w", encoding="utf-8") as f:
+            f.write(f"session: {name}\nwall: {wall:.2f}s\nblocked: {blocked:.2f}s (time.sleep: {slept:.2f}s)\n"
+                    f"compute: {compute:.2f}s (thread CPU time)\n\n")
+            f.write(top.getvalue())
+
+        share = 100.0 * blocked / wall if wall > 0 else 0.0
+        print(f"[PROFILE] {name}: wall={wall:.1f}s blocked={blocked:.1f}s ({share:.0f}%, time.sleep {slept:.1f}s) "
+              f"compute={compute:.1f}s")
+        print(f"[PROFILE] Wrote {base}.prof (cProfile), {base}.folded (flamegraph stacks), {base}.txt (summary)")
+
+def profiled(name: str):
+    """
+    Decorator for mode entry points. When profiling is off the wrapper only checks a flag;
+    when on, each call is one profiled session (cProfile + stack samples + blocked/compute split).
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            return _run_profiled(name, fn, *args, **kwargs)
+        return wrapper
+    return decorator
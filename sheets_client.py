@@ -0,0 +1,348 @@
+import random
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+import gspread
+
+# Load configuration from config_template.py
+try:
+    from config_template import (
+        SERVICE_ACCOUNT_KEY_PATH,
+        GOOGLE_SHEETS_NAME,
+        SCOPES,
+        SHEETS_BACKEND,
+        SHEETS_READS_PER_MIN,
+        SHEETS_WRITES_PER_MIN,
+        SHEETS_MAX_RETRIES,
+        SHEETS_BACKOFF_SEC,
+        SHEETS_CACHE_TTL_SEC
+    )
+except ImportError as e:
+    print(f"[ERROR] Failed to import configuration in sheets_client.py: {e}")
+    print("Please ensure config_template.py exists and .env is configured properly.")
+    raise
+
+CHECKIN_LABEL = "Check-in"
+CHECKOUT_LABEL = "Check-out"
+
+# HTTP status codes the Sheets API uses for quota exhaustion and transient failures.
+RETRYABLE_STATUS = (429, 500, 502, 503, 504)
+
+
+def _status_of(exc):
+    """HTTP status of a gspread APIError (or FakeAPIError), else None."""
+    code = getattr(exc, "code", None)
+    if code is None:
+        response = getattr(exc, "response", None)
+        code = getattr(response, "status_code", None)
+    return code
+
+
+# ==========================
+# Request budget
+# ==========================
+class QuotaBudget:
+    """
+    Sliding-window request budget, one window per request kind ('read' / 'write').
+    `acquire()` blocks until a request fits in the budget, so we slow down before Google says 429.
+    """
+
+    def __init__(self, reads_per_window: int = SHEETS_READS_PER_MIN, writes_per_window: int = SHEETS_WRITES_PER_MIN,
+                 window_sec: float = 60.0, clock=time.monotonic, sleep=time.sleep):
+        self.limits = {"read": reads_per_window, "write": writes_per_window}
+        self.window_sec = window_sec
+        self._sent = {"read": deque(), "write": deque()}
+        self._lock = threading.Lock()
+        self._clock = clock
+        self._sleep = sleep
+        self.waited_sec = 0.0
+
+    def _expire(self, kind, now):
+        sent = self._sent[kind]
+        while sent and now - sent[0] >= self.window_sec:
+            sent.popleft()
+
+    def acquire(self, kind: str):
+        while True:
+            with self._lock:
+                now = self._clock()
+                self._expire(kind, now)
+                sent = self._sent[kind]
+                if len(sent) < self.limits[kind]:
+                    sent.append(now)
+                    return
+                wait = self.window_sec - (now - sent[0])
+            self.waited_sec += wait
+            self._sleep(wait)
+
+    def used(self, kind: str) -> int:
+        with self._lock:
+            self._expire(kind, self._clock())
+            return len(self._sent[kind])
+
+
+# ==========================
+# Coalescing client
+# ==========================
+class SheetsClient:
+    """
+    Quota-aware access to the attendance worksheet.
+
+    - The name column and the two header rows are read once and cached (refreshed after
+      SHEETS_CACHE_TTL_SEC when nothing is pending), instead of re-reading them per event.
+    - Cell writes are queued by store() and sent as one update_cells() batch by flush();
+      repeated writes to the same cell are merged. The Sheets stage (pipeline_stages.py) stores
+      each batch of events it takes and flushes it before counting them as done.
+    - Every API call goes through the request budget and is retried with exponential
+      backoff and jitter on 429/5xx.
+    """
+
+    def __init__(self, worksheet, budget: QuotaBudget = None, max_retries: int = SHEETS_MAX_RETRIES,
+                 backoff_sec: float = SHEETS_BACKOFF_SEC, cache_ttl_sec: float = SHEETS_CACHE_TTL_SEC,
+                 sleep=time.sleep):
+        self.worksheet = worksheet
+        self.budget = budget or QuotaBudget()
+        self.max_retries = max_retries
+        self.backoff_sec = backoff_sec
+        self.cache_ttl_sec = cache_ttl_sec
+        self._sleep = sleep
+
+        self._lock = threading.RLock()
+        self._names = None        # lower-cased name -> row
+        self._next_row = None
+        self._columns = None      # (date, label) -> column
+        self._next_col = None
+        self._cache_loaded_at = 0.0
+        self._pending = {}        # (row, col) -> value
+        self._flushing = False
+
+        self.api_calls = {"read": 0, "write": 0}
+        self.retries = 0
+
+    # ---------- API calls ----------
+    def _call(self, kind: str, fn, *args, **kwargs):
+        for attempt in range(self.max_retries + 1):
+            self.budget.acquire(kind)
+            self.api_calls[kind] += 1
+            try:
+                return fn(*args, **kwargs)
+            except Exception as e:
+                status = _status_of(e)
+                if status not in RETRYABLE_STATUS or attempt == self.max_retries:
+                    raise
+                delay = random.uniform(0, self.backoff_sec * (2 ** attempt))
+                self.retries += 1
+                print(f"[GSHEETS] {kind} got HTTP {status}; retry {attempt + 1}/{self.max_retries} in {delay:.1f}s")
+                self._sleep(delay)
+
+    # ---------- cached layout ----------
+    def _load_layout(self):
+        names = self._call("read", self.worksheet.col_values, 1)
+        dates = self._call("read", self.worksheet.row_values, 1)
+        labels = self._call("read", self.worksheet.row_values, 2)
+
+        self._names = {}
+        for idx, cell in enumerate(names, start=1):
+            self._names.setdefault(cell.strip().lower(), idx)
+        self._next_row = len(names) + 1
+
+        self._columns = {}
+        for idx, date_cell in enumerate(dates, start=1):
+            label = labels[idx - 1] if idx - 1 < len(labels) else ""
+            self._columns.setdefault((date_cell, label), idx)
+        self._next_col = len(dates) + 1
+        self._cache_loaded_at = time.monotonic()
+
+    def _ensure_layout(self):
+        stale = time.monotonic() - self._cache_loaded_at > self.cache_ttl_sec
+        # Never reload while writes are queued or in flight: the sheet would not show them yet.
+        if self._names is None or (stale and not self._pending and not self._flushing):
+            self._load_layout()
+
+    def _row_for(self, name: str) -> int:
+        key = name.strip().lower()
+        row = self._names.get(key)
+        if row is None:
+            row = self._next_row
+            self._next_row += 1
+            self._names[key] = row
+            self._pending[(row, 1)] = name
+        return row
+
+    def _column_for(self, day: str, label: str) -> int:
+        col = self._columns.get((day, label))
+        if col is None:
+            col = self._next_col
+            self._next_col += 1
+            self._columns[(day, label)] = col
+            self._pending[(1, col)] = day
+            self._pending[(2, col)] = label
+        return col
+
+    # ---------- public API ----------
+    def store(self, name: str, ts: str, label: str, value: str):
+        """Queues `value` in the student's row under today's `label` column."""
+        day = datetime.strptime(ts, "%Y-%m-%d %H:%M:%S").strftime("%Y-%m-%d")
+        with self._lock:
+            self._ensure_layout()
+            col = self._column_for(day, label)
+            row = self._row_for(name)
+            self._pending[(row, col)] = value
+
+    def store_checkin(self, name: str, ts: str):
+        time_only = datetime.strptime(ts, "%Y-%m-%d %H:%M:%S").strftime("%H:%M:%S")
+        self.store(name, ts, CHECKIN_LABEL, time_only)
+        print(f"[GSHEETS] Queued check-in for {name} at {time_only}")
+
+    def store_checkout(self, name: str, ts: str, guardian_name: str):
+        time_only = datetime.strptime(ts, "%Y-%m-%d %H:%M:%S").strftime("%H:%M:%S")
+        self.store(name, ts, CHECKOUT_LABEL, f"{time_only} (Guardian: {guardian_name})")
+        print(f"[GSHEETS] Queued checkout for {name} with {guardian_name} at {time_only}")
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def flush(self) -> bool:
+        """Sends all queued cells in one batch. On failure they stay queued for the next flush."""
+        with self._lock:
+            if not self._pending:
+                return True
+            batch, self._pending = self._pending, {}
+            self._flushing = True
+        cells = [gspread.Cell(row, col, value) for (row, col), value in sorted(batch.items())]
+        try:
+            self._call("write", self.worksheet.update_cells, cells)
+            print(f"[GSHEETS] Flushed {len(cells)} cell(s) in one request.")
+            return True
+        except Exception as e:
+            with self._lock:
+                # Newer writes to the same cell win over the failed batch.
+                batch.update(self._pending)
+                self._pending = batch
+            print(f"[ERR] Google Sheets flush failed, {len(batch)} cell(s) kept for retry: {e}")
+            return False
+        finally:
+            with self._lock:
+                self._flushing = False
+
+    def close(self):
+        self.flush()
+
+
+# ==========================
+# In-process fake worksheet
+# ==========================
+class FakeAPIError(Exception):
+    """Mimics gspread.exceptions.APIError closely enough for retry handling (carries `.code`)."""
+
+    def __init__(self, code: int, message: str):
+        super().__init__(f"{code}: {message}")
+        self.code = code
+
+
+class FakeWorksheet:
+    """
+    Dictionary-backed stand-in for a gspread Worksheet with Google's per-window quota behaviour:
+    more than `reads_per_window` reads or `writes_per_window` writes inside `window_sec`
+    raise FakeAPIError(429). Set SHEETS_BACKEND=fake to run a gate (or a load test) without Google.
+    """
+
+    def __init__(self, reads_per_window: int = 60, writes_per_window: int = 60, window_sec: float = 60.0,
+                 latency_sec: float = 0.0, clock=time.monotonic):
+        self.cells = {}
+        self.reads_per_window = reads_per_window
+        self.writes_per_window = writes_per_window
+        self.window_sec = window_sec
+        self.latency_sec = latency_sec
+        self._clock = clock
+        self._requests = {"read": deque(), "write": deque()}
+        self._lock = threading.Lock()
+        self.calls = {"read": 0, "write": 0}
+        self.rejected = 0
+
+    def _request(self, kind: str):
+        with self._lock:
+            now = self._clock()
+            window = self._requests[kind]
+            while window and now - window[0] >= self.window_sec:
+                window.popleft()
+            limit = self.reads_per_window if kind == "read" else self.writes_per_window
+            self.calls[kind] += 1
+            if len(window) >= limit:
+                self.rejected += 1
+                raise FakeAPIError(429, f"Quota exceeded for quota metric '{kind} requests'")
+            window.append(now)
+        if self.latency_sec:
+            time.sleep(self.latency_sec)
+
+    def col_values(self, col: int):
+        self._request("read")
+        rows = [r for (r, c) in self.cells if c == col]
+        return [self.cells.get((r, col), "") for r in range(1, max(rows, default=0) + 1)]
+
+    def row_values(self, row: int):
+        self._request("read")
+        cols = [c for (r, c) in self.cells if r == row]
+        return [self.cells.get((row, c), "") for c in range(1, max(cols, default=0) + 1)]
+
+    def cell(self, row: int, col: int):
+        self._request("read")
+        return gspread.Cell(row, col, self.cells.get((row, col)))
+
+    def update_cell(self, row: int, col: int, value):
+        self._request("write")
+        self.cells[(row, col)] = value
+
+    def update_cells(self, cell_list):
+        self._request("write")
+        for c in cell_list:
+            self.cells[(c.row, c.col)] = c.value
+
+
+# ==========================
+# Shared client
+# ==========================
+_client = None
+_client_lock = threading.Lock()
+
+def open_worksheet():
+    """Opens the configured worksheet (or a FakeWorksheet when SHEETS_BACKEND=fake). Returns None on failure."""
+    if SHEETS_BACKEND.strip().lower() == "fake":
+        print("[INFO] Using in-process fake Google Sheets worksheet.")
+        return FakeWorksheet()
+    try:
+        from google.oauth2.service_account import Credentials
+        creds = Credentials.from_service_account_file(SERVICE_ACCOUNT_KEY_PATH, scopes=SCOPES)
+        gc = gspread.authorize(creds)
+        worksheet = gc.open(GOOGLE_SHEETS_NAME).sheet1
+        print("[INFO] Google Sheets authorized successfully.")
+        return worksheet
+    except Exception as e:
+        print(f"[ERR] Failed to authorize Google Sheets: {e}")
+        print("Please ensure the service account key path is correct and has access to the spreadsheet.")
+        return None
+
+def get_sheets_client():
+    """
+    Returns the process-wide SheetsClient, or None if Sheets is unavailable. Only the Sheets stage calls it
+    (see pipeline_stages.py), so authorising, and retrying that during an outage, never delays a mode.
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            worksheet = open_worksheet()
+            if worksheet is None:
+                return None
+            _client = SheetsClient(worksheet)
+        return _client
+
+def close_sheets_client():
+    """Sends any cell writes still queued (e.g. from a batch that failed) and drops the client, if it was started."""
+    global _client
+    with _client_lock:
+        client, _client = _client, None
+    if client is not None:
+        client.close()
@@ -0,0 +1,264 @@
+"""
+Tune TOLERANCE, FRAME_SCALE (or DETECT_SCALE), PROCESS_EVERY_N and DETECTION_MODEL for one gate PC.
+
+    python tune_recognition.py --data D:/gate_samples
+    python tune_recognition.py --data D:/gate_samples --models hog,yunet --scales 0.25,0.5 --csv sweep.csv
+    python tune_recognition.py --data D:/gate_samples --mode two_stage --scales 0.2,0.25,0.35
+
+--data holds one folder per person, named exactly like the student folder in STUDENTS_DIR,
+containing gate images and/or short clips of that person walking up to the camera. People who
+are not enrolled go in a folder called "unknown"; every match on them is a false match.
+
+Every frame goes through the live recognition path (recognition_engine.RecognitionEngine: the
+configured detect/encode pipeline followed by nearest-neighbour matching against the gallery),
+so run this on the gate PC itself. --mode defaults to RECOGNITION_MODE; --scales sweeps FRAME_SCALE
+in 'single' mode and DETECT_SCALE in 'two_stage' mode (where FRAME_SCALE is not used).
+Encodings are computed once per (model, scale); tolerance
+and PROCESS_EVERY_N are then swept over the recorded distances, which keeps large sweeps cheap.
+
+Per combination it reports:
+  TMR       frames of enrolled people where the right student was matched
+  FMR       frames where anyone was matched to the wrong student
+  ms/frame  detect+encode+match time per processed frame
+  cam fps   camera frame rate the loop keeps up with (PROCESS_EVERY_N * 1000 / ms/frame)
+  id delay  clips only: camera frames until the person is first matched correctly
+
+and prints the Pareto frontier (no other combination has higher TMR, lower FMR and lower CPU per
+camera frame at once) plus a suggested .env for --max-fmr and --camera-fps.
+"""
+import argparse
+import csv
+import glob
+import os
+import time
+
+import cv2
+
+from config_template import STUDENTS_DIR, RECOGNITION_MODE
+from face_detectors import DETECTORS, get_face_detector
+from recognition_engine import Gallery, RecognitionEngine
+
+IMAGE_EXTS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+CLIP_EXTS = (".mp4", ".avi", ".mov", ".mkv")
+UNKNOWN_LABEL = "unknown"
+
+
+def parse_floats(value):
+    return [float(v) for v in value.split(",") if v.strip()]
+
+def parse_ints(value):
+    return [int(v) for v in value.split(",") if v.strip()]
+
+
+def load_samples(data_dir, max_clip_frames):
+    """[(label, kind, [bgr frames])] where kind is 'image' (one frame) or 'clip'."""
+    samples = []
+    for label in sorted(os.listdir(data_dir)):
+        person_dir = os.path.join(data_dir, label)
+        if not os.path.isdir(person_dir):
+            continue
+        for path in sorted(glob.glob(os.path.join(person_dir, "*"))):
+            ext = os.path.splitext(path)[1].lower()
+            if ext in IMAGE_EXTS:
+                bgr = cv2.imread(path)
+                if bgr is None:
+                    print(f"[WARN] Could not read {path}, skipped.")
+                    continue
+                samples.append((label, "image", [bgr]))
+            elif ext in CLIP_EXTS:
+                cap = cv2.VideoCapture(path)
+                frames = []
+                while len(frames) < max_clip_frames:
+                    ret, frame = cap.read()
+                    if not ret:
+                        break
+                    frames.append(frame)
+                cap.release()
+                if not frames:
+                    print(f"[WARN] Could not decode {path}, skipped.")
+                    continue
+                samples.append((label, "clip", frames))
+    return samples
+
+
+def scale_setting(mode):
+    """The .env setting that --scales tunes in `mode`."""
+    return "DETECT_SCALE" if mode == "two_stage" else "FRAME_SCALE"
+
+
+def record_pass(detector, mode, scale, samples, gallery):
+    """
+    Runs every frame once through the live path with matching unrestricted (tolerance=inf), so the
+    best name and distance of each face are known and any tolerance can be applied afterwards.
+    Returns per-sample lists of (seconds, [(name, distance)]) per frame.
+    """
+    if mode == "two_stage":
+        engine = RecognitionEngine(gallery, detector, mode=mode, detect_scale=scale, tolerance=float("inf"))
+    else:
+        engine = RecognitionEngine(gallery, detector, mode=mode, frame_scale=scale, tolerance=float("inf"))
+    engine.recognize_frame(samples[0][2][0])  # warm-up
+    recorded = []
+    for label, kind, frames in samples:
+        per_frame = []
+        for frame in frames:
+            start = time.perf_counter()
+            matches = engine.recognize_frame(frame)
+            elapsed = time.perf_counter() - start
+            per_frame.append((elapsed, [(name, dist) for _box, name, dist in matches]))
+        recorded.append((label, kind, per_frame))
+    return recorded
+
+
+def score(recorded, tolerance, every_n):
+    """Applies one tolerance / PROCESS_EVERY_N to a recorded pass."""
+    known_frames = true_frames = false_frames = total_frames = 0
+    elapsed = 0.0
+    delays = []
+    missed_clips = 0
+    for label, kind, per_frame in recorded:
+        # Still images are always processed; clips follow the live loop (frame_count % N == 0, counting from 1).
+        indices = range(len(per_frame)) if kind == "image" else range(every_n - 1, len(per_frame), every_n)
+        first_hit = None
+        for i in indices:
+            seconds, faces = per_frame[i]
+            matched = {name for name, dist in faces if dist is not None and dist <= tolerance}
+            total_frames += 1
+            elapsed += seconds
+            if label != UNKNOWN_LABEL:
+                known_frames += 1
+                if label in matched:
+                    true_frames += 1
+                    if first_hit is None:
+                        first_hit = i + 1
+            if matched - {label}:
+                false_frames += 1
+        if kind == "clip" and label != UNKNOWN_LABEL:
+            if first_hit is None:
+                missed_clips += 1
+            else:
+                delays.append(first_hit)
+
+    ms_per_frame = 1000.0 * elapsed / total_frames if total_frames else 0.0
+    return {
+        "tmr": true_frames / known_frames if known_frames else 0.0,
+        "fmr": false_frames / total_frames if total_frames else 0.0,
+        "ms_per_frame": ms_per_frame,
+        "cpu_ms_per_cam_frame": ms_per_frame / every_n,
+        "cam_fps": every_n * 1000.0 / ms_per_frame if ms_per_frame > 0 else float("inf"),
+        "id_delay_frames": sum(delays) / len(delays) if delays else None,
+        "missed_clips": missed_clips,
+    }
+
+
+def pareto_frontier(results):
+    """Combinations not dominated on (TMR high, FMR low, CPU per camera frame low)."""
+    def dominates(a, b):
+        no_worse = a["tmr"] >= b["tmr"] and a["fmr"] <= b["fmr"] and a["cpu_ms_per_cam_frame"] <= b["cpu_ms_per_cam_frame"]
+        better = a["tmr"] > b["tmr"] or a["fmr"] < b["fmr"] or a["cpu_ms_per_cam_frame"] < b["cpu_ms_per_cam_frame"]
+        return no_worse and better
+    frontier = []
+    seen = set()
+    # Tolerances that behave identically on this data tie; keep the strictest of them.
+    for r in sorted(results, key=lambda r: r["tolerance"]):
+        key = (r["model"], r["scale"], r["every_n"], r["tmr"], r["fmr"])
+        if key in seen or any(dominates(o, r) for o in results):
+            continue
+        seen.add(key)
+        frontier.append(r)
+    return sorted(frontier, key=lambda r: r["cpu_ms_per_cam_frame"])
+
+
+def recommend(frontier, max_fmr, camera_fps):
+    fits = [r for r in frontier if r["fmr"] <= max_fmr and r["cam_fps"] >= camera_fps]
+    if not fits:
+        return None
+    return max(fits, key=lambda r: (r["tmr"], -r["cpu_ms_per_cam_frame"]))
+
+
+def print_table(rows):
+    print(f"{'model':<7} {'scale':>5} {'N':>3} {'tol':>5} {'TMR':>7} {'FMR':>7} {'ms/frame':>9} {'cam fps':>8} {'id delay':>9}")
+    for r in rows:
+        delay = f"{r['id_delay_frames']:.1f}" if r["id_delay_frames"] is not None else "-"
+        print(f"{r['model']:<7} {r['scale']:>5.2f} {r['every_n']:>3} {r['tolerance']:>5.2f} {r['tmr']:>7.1%} "
+              f"{r['fmr']:>7.2%} {r['ms_per_frame']:>9.1f} {r['cam_fps']:>8.1f} {delay:>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep recognition parameters over labelled gate images/clips.")
+    parser.add_argument("--data", required=True, help="One folder per person (student folder name, or 'unknown').")
+    parser.add_argument("--students", default=STUDENTS_DIR, help="Enrolled gallery (default: STUDENTS_DIR).")
+    parser.add_argument("--models", default="hog", help=f"Detection models to try ({', '.join(DETECTORS)}).")
+    parser.add_argument("--mode", default=RECOGNITION_MODE, choices=["single", "two_stage"],
+                        help="Recognition mode to tune (default: RECOGNITION_MODE).")
+    parser.add_argument("--scales", type=parse_floats, default=[0.25, 0.5, 0.75],
+                        help="FRAME_SCALE values ('single') or DETECT_SCALE values ('two_stage').")
+    parser.add_argument("--every-n", type=parse_ints, default=[1, 2, 3, 4], help="PROCESS_EVERY_N values.")
+    parser.add_argument("--tolerances", type=parse_floats, default=[0.40, 0.45, 0.50, 0.55, 0.60, 0.65], help="TOLERANCE values.")
+    parser.add_argument("--max-clip-frames", type=int, default=150, help="Frames decoded per clip.")
+    parser.add_argument("--max-fmr", type=float, default=0.0, help="Highest acceptable false match rate for the suggestion.")
+    parser.add_argument("--camera-fps", type=float, default=15.0, help="Camera frame rate the loop must keep up with.")
+    parser.add_argument("--csv", default=None, help="Write every combination to this CSV file.")
+    args = parser.parse_args()
+
+    samples = load_samples(args.data, args.max_clip_frames)
+    if not samples:
+        print(f"[ERR] No images or clips found under {args.data}")
+        return
+    frames = sum(len(f) for _, _, f in samples)
+    print(f"[TUNE] {len(samples)} samples ({frames} frames) from {args.data}")
+    setting = scale_setting(args.mode)
+    print(f"[TUNE] Mode {args.mode}: --scales sweeps {setting}")
+
+    results = []
+    for model in [m.strip().lower() for m in args.models.split(",") if m.strip()]:
+        try:
+            detector = get_face_detector(model)
+        except Exception as e:
+            print(f"[WARN] Skipping model '{model}': {e}")
+            continue
+        # The gallery is encoded with the same detector the live mode would use.
+        gallery = Gallery.from_dir(args.students, detector)
+        if len(gallery) == 0:
+            print("[ERR] No enrolled encodings; check --students.")
+            return
+        for scale in args.scales:
+            start = time.perf_counter()
+            recorded = record_pass(detector, args.mode, scale, samples, gallery)
+            print(f"[TUNE] {model} @ {setting} {scale:.2f}: {frames} frames in {time.perf_counter() - start:.1f}s")
+            for every_n in args.every_n:
+                for tolerance in args.tolerances:
+                    r = score(recorded, tolerance, every_n)
+                    r.update(model=model, mode=args.mode, scale=scale, every_n=every_n, tolerance=tolerance)
+                    results.append(r)
+
+    if not results:
+        return
+
+    if args.csv:
+        fields = ["model", "mode", "scale", "every_n", "tolerance", "tmr", "fmr", "ms_per_frame",
+                  "cpu_ms_per_cam_frame", "cam_fps", "id_delay_frames", "missed_clips"]
+        with open(args.csv, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=fields)
+            writer.writeheader()
+            writer.writerows(results)
+        print(f"[TUNE] Wrote {len(results)} combinations to {args.csv}")
+
+    frontier = pareto_frontier(results)
+    print(f"\nPareto frontier ({len(frontier)} of {len(results)} combinations):\n")
+    print_table(frontier)
+
+    best = recommend(frontier, args.max_fmr, args.camera_fps)
+    if best is None:
+        print(f"\n[TUNE] No combination reaches FMR <= {args.max_fmr:.2%} at {args.camera_fps:g} fps; "
+              "relax --max-fmr/--camera-fps or add enrollment photos.")
+        return
+    print(f"\n[TUNE] Suggested .env for this PC (FMR <= {args.max_fmr:.2%}, >= {args.camera_fps:g} camera fps):")
+    print(f"DETECTION_MODEL={best['model']}")
+    print(f"RECOGNITION_MODE={args.mode}")
+    print(f"{setting}={best['scale']:g}")
+    print(f"PROCESS_EVERY_N={best['every_n']}")
+    print(f"TOLERANCE={best['tolerance']:g}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+import threading
+import time
+
+import numpy as np
+
+# Load configuration from config_template.py
+try:
+    from config_template import (
+        CAMERA_READY_TIMEOUT_SEC,
+        CAMERA_READY_STABLE_FRAMES,
+        CAMERA_READY_MAX_DELTA,
+        CAMERA_READY_MIN_BRIGHTNESS
+    )
+except ImportError as e:
+    print(f"[ERROR] Failed to import configuration in warmup.py: {e}")
+    print("Please ensure config_template.py exists and .env is configured properly.")
+    raise
+
+# ==========================
+# Model warm-up
+# ==========================
+_models_ready = threading.Event()
+_warmup_thread = None
+_warmup_lock = threading.Lock()
+
+def _warm_models():
+    start = time.perf_counter()
+    try:
+        # Importing face_recognition loads dlib's detector, shape predictor and ResNet weights. The
+        # recognition modules import it lazily, so this thread is where that happens.
+        import face_recognition
+        from face_detectors import get_face_detector
+
+        # One dummy inference through each model so lazy initialisation happens now, not on the first student.
+        dummy = np.zeros((160, 160, 3), dtype=np.uint8)
+        get_face_detector().detect(dummy)
+        face_recognition.face_encodings(dummy, [(20, 140, 140, 20)])
+        print(f"[WARMUP] Face models loaded and warmed up in {time.perf_counter() - start:.1f}s")
+    except Exception as e:
+        # The modes will report the real error when they initialise the detector themselves.
+        print(f"[WARMUP] Model warm-up failed ({e}); models will load on first use.")
+    finally:
+        _models_ready.set()
+
+def start_model_warmup():
+    """Loads and warms up the face models in a background thread (safe to call more than once)."""
+    global _warmup_thread
+    with _warmup_lock:
+        if _warmup_thread is None:
+            _warmup_thread = threading.Thread(target=_warm_models, name="model-warmup", daemon=True)
+            _warmup_thread.start()
+
+def wait_for_models(timeout: float = None) -> bool:
+    """Blocks until warm-up has finished, starting it first if nobody has yet."""
+    start_model_warmup()
+    if not _models_ready.is_set():
+        print("[WARMUP] Waiting for face models to finish loading...")
+    return _models_ready.wait(timeout)
+
+
+# ==========================
+# Camera readiness
+# ==========================
+def wait_for_camera_ready(read_frame, stop_event=None, timeout: float = CAMERA_READY_TIMEOUT_SEC,
+                          stable_frames: int = CAMERA_READY_STABLE_FRAMES, max_delta: float = CAMERA_READY_MAX_DELTA,
+                          min_brightness: float = CAMERA_READY_MIN_BRIGHTNESS):
+    """
+    Reads frames until the camera's auto-exposure has settled: the mean brightness is above
+    `min_brightness` and changes by at most `max_delta` for `stable_frames` frames in a row.
+    `read_frame()` must behave like cap.read(). Gives up after `timeout` seconds.
+    Returns (ready, frames_read, seconds_waited).
+    """
+    start = time.perf_counter()
+    previous = None
+    stable = 0
+    frames = 0
+    while time.perf_counter() - start < timeout:
+        if stop_event is not None and stop_event.is_set():
+            break
+        ret, frame = read_frame()
+        if not ret or frame is None:
+            continue
+        frames += 1
+        # A sparse grid of pixels is plenty for an exposure estimate.
+        brightness = float(frame[::16, ::16].mean())
+        if previous is not None and brightness >= min_brightness and abs(brightness - previous) <= max_delta:
+            stable += 1
+            if stable >= stable_frames:
+                return True, frames, time.perf_counter() - start
+        else:
+            stable = 0
+        previous = brightness
+    return False, frames, time.perf_counter() - start